@@ -1,56 +1,309 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import inspect
+import json
+import os
 import os.path
-from typing import Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'read_only')
+SOURCE_FILES = ('train_data.csv', 'test_data.csv', 'game_info.csv', 'test_data_improvement.csv')
+CACHE_DIRNAME = 'cache'
+CACHE_MANIFEST = 'manifest.json'
+# Key of the fingerprint of the transformation code in the cache manifest
+LOADER_KEY = 'loader'
+SPLITS = ('train', 'test')
+SPLIT_FILES = {'train': 'train_data.csv', 'test': 'test_data.csv'}
+# Compact dtypes applied by `load(compact=True)`. float64 columns are converted into float32.
+COMPACT_DTYPES = {
+    'totalPitchingCount': np.int16,
+    'B': np.int8,
+    'S': np.int8,
+    'O': np.int8,
+    'b1': np.int8,
+    'b2': np.int8,
+    'b3': np.int8,
+    'y': np.int8,
+    'inning': 'category',
+    'pitcher': 'category',
+    'pitcherHand': 'category',
+    'batter': 'category',
+    'batterHand': 'category',
+    'pitchType': 'category',
+    'ballPositionLabel': 'category',
+}
 
-def load() -> Tuple[pd.DataFrame, pd.DataFrame]:
+
+def load(
+        use_cache: bool = False,
+        data_dir: Optional[str] = None,
+        compact: bool = False,
+        columns: Optional[List[str]] = None,
+        splits: Iterable[str] = SPLITS,
+        verbose: bool = False) -> Tuple[pd.DataFrame, ...]:
     '''Load training and test set.
 
     Load and apply following transformation to competition dataset.
     1st, training set is known to have duplicate rows thus drop them.
-    2nd, bool columns in training/test set are conveted into integer flag. 
+    2nd, bool columns in training/test set are conveted into integer flag.
     3rd, "test_data.csv" is known to have missing `pitcher` and `batter` thus they are to be interpolated by official external data.
     Finally, game information is merged into training/test set associated with `gameID`.
 
     Parameters
     ----------
-    train_filepath, test_filepath, game_info_filepath: str
-      Filepaths of competition dataset.
+    use_cache: bool
+        If True, transformed dataset is stored in binary form under `{data_dir}/cache`
+        and reused as long as source csv files and the code transforming them are unchanged.
+    data_dir: str, optional
+        Directory of competition dataset. "read_only" directory is used if not given.
+    compact: bool
+        If True, dtypes are converted by `compact_dtypes`. Category columns of the splits loaded
+        together share the same categories, the union of values of those splits.
+    columns: List[str], optional
+        Columns to be loaded, all columns if not given. Only these columns are read from csv
+        files (unless `use_cache`) and game information is merged only if requested.
+        Columns which a split does not have (e.g. `y` for test set) are ignored for that split.
+    splits: Iterable[str]
+        Which of "train" and "test" are loaded, by default both.
+    verbose: bool
+        If True, memory usage before and after `compact` conversion is printed.
+
+    Return
+    ------
+    dataset: Tuple[pd.DataFrame, ...]
+        Dataframe of each split transformed, (train, test) by default.
+    '''
+    if data_dir is None:
+        data_dir = DATA_DIR
+    splits = tuple(splits)
+    unknown_splits = set(splits) - set(SPLITS)
+    if unknown_splits:
+        raise ValueError(f'`splits` must be some of {SPLITS} but {sorted(unknown_splits)} given')
+    if columns is not None:
+        known_columns = set(_read_header(data_dir, 'game_info.csv'))
+        for split in SPLITS:
+            known_columns |= set(_read_header(data_dir, SPLIT_FILES[split]))
+        unknown_columns = [c for c in columns if c not in known_columns]
+        if unknown_columns:
+            raise KeyError(f'Columns not in competition dataset: {unknown_columns}')
+
+    if use_cache:
+        cached = dict(zip(SPLITS, _load_cache(data_dir)))
+        dataset = [_project(cached[split], columns) for split in splits]
+    else:
+        dataset = [_load_csv(data_dir, split, columns) for split in splits]
+    if compact:
+        categories = shared_categories(dataset)
+        dataset = [
+            compact_dtypes(df, verbose=verbose, categories=categories, name=split)
+            for split, df in zip(splits, dataset)
+        ]
+    return tuple(dataset)
+
+
+def shared_categories(dataset: Iterable[pd.DataFrame]) -> Dict[str, pd.CategoricalDtype]:
+    '''`pd.CategoricalDtype` of each category column of `COMPACT_DTYPES` common to `dataset`.
+
+    Categories are sorted union of values of all dataframes having the column, so that
+    `cat.codes` agree among them and `pd.concat` keeps category dtype.
+    '''
+    dataset = list(dataset)
+    categories = {}
+    for c, dtype in COMPACT_DTYPES.items():
+        if dtype != 'category':
+            continue
+        values = [df[c].dropna().unique() for df in dataset if c in df.columns]
+        if values:
+            categories[c] = pd.CategoricalDtype(np.sort(pd.unique(np.concatenate(values))))
+    return categories
+
+
+def compact_dtypes(
+        df: pd.DataFrame,
+        verbose: bool = True,
+        categories: Optional[Dict[str, pd.CategoricalDtype]] = None,
+        name: str = 'dataset') -> pd.DataFrame:
+    '''Convert dtypes of `df` following `COMPACT_DTYPES` and float64 into float32.
+
+    Integer columns having missing values are left as they are.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Dataset to be converted.
+    verbose: bool
+        If True, memory usage before and after conversion is printed.
+    categories: Dict[str, pd.CategoricalDtype], optional
+        Dtype of category columns, e.g. `shared_categories([train, test])`. Categories are
+        inferred from `df` for columns not given.
+    name: str
+        Name of `df` printed with memory usage, e.g. "train".
 
     Return
     ------
-    dataset: Tuple[pd.DataFrame, pd.DataFrame]
-        Dataframe of training/test set transformed.
+    df: pd.DataFrame
+        Converted dataset.
     '''
+    dtypes = {}
+    for c, dtype in COMPACT_DTYPES.items():
+        if c not in df.columns:
+            continue
+        if dtype != 'category' and df[c].isnull().any():
+            continue
+        dtypes[c] = dtype
+        if dtype == 'category' and categories is not None and c in categories:
+            dtypes[c] = categories[c]
+    for c in df.select_dtypes(include=[np.float64]).columns:
+        dtypes[c] = np.float32
+    converted = df.astype(dtypes)
+    if verbose:
+        mb = 1024 ** 2
+        before = df.memory_usage(deep=True).sum() / mb
+        after = converted.memory_usage(deep=True).sum() / mb
+        print(f'Memory usage of {name}: {before:.1f} MB -> {after:.1f} MB')
+    return converted
+
+
+def _load_cache(data_dir: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    cache_dir = os.path.join(data_dir, CACHE_DIRNAME)
+    train_cache = os.path.join(cache_dir, 'train.pickle')
+    test_cache = os.path.join(cache_dir, 'test.pickle')
+    manifest = _read_manifest(cache_dir)
+    fingerprints = _fingerprint_sources(data_dir, manifest)
+    is_valid = all(
+        manifest.get(filename, {}).get('sha1') == fingerprint['sha1']
+        for filename, fingerprint in fingerprints.items()
+    )
+    fingerprints[LOADER_KEY] = _loader_fingerprint()
+    is_valid = is_valid and manifest.get(LOADER_KEY) == fingerprints[LOADER_KEY]
+    if is_valid and os.path.isfile(train_cache) and os.path.isfile(test_cache):
+        if manifest != fingerprints:  # Only mtime changed, e.g. files are copied
+            _write_manifest(cache_dir, fingerprints)
+        return (pd.read_pickle(train_cache), pd.read_pickle(test_cache))
+
+    train, test = [_load_csv(data_dir, split) for split in SPLITS]
+    os.makedirs(cache_dir, exist_ok=True)
+    train.to_pickle(train_cache, protocol=-1)
+    test.to_pickle(test_cache, protocol=-1)
+    _write_manifest(cache_dir, fingerprints)
+    return (train, test)
+
+
+def _load_csv(data_dir: str, split: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    game_info_columns = [c for c in _read_header(data_dir, 'game_info.csv')
+                         if c not in ('Unnamed: 0', 'gameID')]
+    if columns is None:
+        merged_columns = game_info_columns
+        usecols = None
+    else:
+        merged_columns = [c for c in game_info_columns if c in columns]
+        usecols = [c for c in _read_header(data_dir, SPLIT_FILES[split])
+                   if c in columns or (c == 'gameID' and merged_columns)]
     # Load
-    data_dir = os.path.join(os.path.dirname(__file__), '..', 'read_only')
-    train = pd.read_csv(os.path.join(data_dir, 'train_data.csv'))
-    test = pd.read_csv(os.path.join(data_dir, 'test_data.csv'))
-    game_info = pd.read_csv(os.path.join(data_dir, 'game_info.csv'), parse_dates=['startDayTime'])
-    official_external_data1 = pd.read_csv(os.path.join(data_dir, 'test_data_improvement.csv'))
+    df = pd.read_csv(os.path.join(data_dir, SPLIT_FILES[split]), usecols=usecols)
 
     # Remove duplication
-    key_columns = [c for c in train.columns if c != 'id']
-    train = train.drop_duplicates(subset=key_columns)
+    if split == 'train':
+        if columns is None:
+            key_columns = [c for c in df.columns if c != 'id']
+            df = df.drop_duplicates(subset=key_columns)
+        else:
+            df = df[~_duplicated_train_rows(data_dir)]
+        df = df.reset_index(drop=True)
 
     # Bool to int
-    base_columns = ['b1', 'b2', 'b3']
-    train[base_columns] = train[base_columns].copy() * 1
-    test[base_columns] = test[base_columns].copy() * 1
+    base_columns = [c for c in ['b1', 'b2', 'b3'] if c in df.columns]
+    df[base_columns] = df[base_columns].copy() * 1
 
     # Interpolate missing `batter` and `pitcher` in "test_data.csv"
-    test[['pitcher', 'batter']] = official_external_data1[['pitcher', 'batter']]
+    interpolated_columns = [c for c in ['pitcher', 'batter'] if c in df.columns]
+    if split == 'test' and interpolated_columns:
+        official_external_data1 = pd.read_csv(
+            os.path.join(data_dir, 'test_data_improvement.csv'), usecols=interpolated_columns)
+        df[interpolated_columns] = official_external_data1[interpolated_columns]
 
-    # Merge game information into training/test set
-    game_info.drop(columns=['Unnamed: 0'], inplace=True)
-    nrows_train, nrows_test = train.shape[0], test.shape[0]
-    train = pd.merge(train, game_info, on='gameID', how='inner')
-    test = pd.merge(test, game_info, on='gameID', how='inner')
-    assert(train.shape[0] == nrows_train)
-    assert(test.shape[0] == nrows_test)
+    # Merge game information
+    if merged_columns:
+        game_info = pd.read_csv(
+            os.path.join(data_dir, 'game_info.csv'),
+            usecols=['gameID'] + merged_columns,
+            parse_dates=['startDayTime'] if 'startDayTime' in merged_columns else False)
+        nrows = df.shape[0]
+        df = pd.merge(df, game_info, on='gameID', how='inner')
+        assert(df.shape[0] == nrows)
 
-    # Return dataset
-    return (train, test)
+    return _project(df, columns)
+
+
+def _project(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+    if columns is None:
+        return df
+    return df[[c for c in columns if c in df.columns]]
+
+
+def _loader_fingerprint() -> str:
+    '''sha1 of the source of the transformation applied to csv files, so that cache made by
+    another version of it is rebuilt.'''
+    sha1 = hashlib.sha1()
+    for func in (_load_csv, _project, _duplicated_train_rows):
+        sha1.update(inspect.getsource(func).encode())
+    return sha1.hexdigest()
+
+
+def _read_header(data_dir: str, filename: str) -> List[str]:
+    return pd.read_csv(os.path.join(data_dir, filename), nrows=0).columns.tolist()
+
+
+def _duplicated_train_rows(data_dir: str) -> np.ndarray:
+    '''Mask of duplicate rows in "train_data.csv", which needs all columns to be identified.
+
+    The mask is computed in memory, nothing is written under `data_dir`. Loading with `use_cache`
+    does not need it since the cached training set has no duplicates.
+    '''
+    train = pd.read_csv(os.path.join(data_dir, SPLIT_FILES['train']))
+    return train.duplicated(subset=[c for c in train.columns if c != 'id']).values
+
+
+def _read_manifest(cache_dir: str, filename: str = CACHE_MANIFEST) -> dict:
+    filepath = os.path.join(cache_dir, filename)
+    if not os.path.isfile(filepath):
+        return {}
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+
+def _write_manifest(cache_dir: str, fingerprints: dict, filename: str = CACHE_MANIFEST) -> None:
+    with open(os.path.join(cache_dir, filename), 'w') as f:
+        json.dump(fingerprints, f, indent=2)
+
+
+def _fingerprint_sources(
+        data_dir: str,
+        manifest: dict,
+        filenames: Tuple[str, ...] = SOURCE_FILES) -> dict:
+    '''Size, mtime and sha1 of each source file.
+
+    Hashing is skipped for the files whose size and mtime are the same as `manifest`,
+    so that warm loading does not have to read whole csv files.
+    '''
+    fingerprints = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(data_dir, filename))
+        cached = manifest.get(filename, {})
+        if cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime_ns:
+            sha1 = cached['sha1']
+        else:
+            sha1 = _sha1(os.path.join(data_dir, filename))
+        fingerprints[filename] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': sha1}
+    return fingerprints
+
+
+def _sha1(filepath: str, chunksize: int = 1 << 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
@@ -1,6 +1,10 @@
+import os
+import os.path
 from collections import defaultdict
+from typing import Iterator, Optional, Tuple
 
 import numpy as np
+import pandas as pd
 from sklearn.model_selection import GroupKFold
 
 import utils
@@ -27,11 +31,8 @@ class PlayerKFold(GroupKFold):
                     valid_groups[i % self.get_n_splits()].append(id_)
                 assigned_ids += ids_left.tolist()
         self.valid_groups_ = valid_groups
-        all_idx = list(range(len(groups)))
-        for valid_ids in valid_groups.values():
-            valid_idx = [i for i, id_ in enumerate(groups.values) if id_ in valid_ids]
-            train_idx = list(set(all_idx) - set(valid_idx))
-            yield train_idx, valid_idx
+        self.row_folds_ = row_folds_from_ids(groups, valid_groups)
+        yield from split_by_folds(self.row_folds_)
 
     def get_n_splits(self, X=None, y=None, groups=None) -> int:
         return self.n_splits
@@ -41,3 +42,66 @@ class PlayerKFold(GroupKFold):
             return self.valid_groups_
         else:
             raise AttributeError('Valid fold is determined after calling `split`')
+
+    def get_row_folds(self) -> np.ndarray:
+        if hasattr(self, 'row_folds_'):
+            return self.row_folds_
+        else:
+            raise AttributeError('Valid fold is determined after calling `split`')
+
+
+def row_folds_from_ids(groups: pd.Series, valid_ids: dict) -> np.ndarray:
+    """Validation fold of each row.
+
+    Parameters
+    ----------
+    groups : pd.Series
+        Group of each row, e.g. `batterID`.
+    valid_ids : dict
+        Groups in each validation fold, e.g. `PlayerKFold.get_valid_ids()` or the content of
+        "group_kfold_{group_col}.json". Keys are fold numbers (int or str).
+
+    Returns
+    -------
+    row_folds : np.ndarray
+        int8 array of fold numbers, `utils.NOT_ASSIGNED` for the rows in no validation fold.
+    """
+    group_values = np.asarray(groups)
+    row_folds = np.full(group_values.shape[0], utils.NOT_ASSIGNED, dtype=np.int8)
+    for i, ids in valid_ids.items():
+        row_folds[np.isin(group_values, np.asarray(ids))] = int(i)
+    return row_folds
+
+
+def split_by_folds(row_folds: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield sorted (train_idx, valid_idx) of each fold in `row_folds`."""
+    for i in np.unique(row_folds[row_folds != utils.NOT_ASSIGNED]):
+        is_valid = row_folds == i
+        yield np.flatnonzero(~is_valid), np.flatnonzero(is_valid)
+
+
+def save_folds(fold_dir: str, name: str, row_folds: np.ndarray, fingerprint: str) -> str:
+    """Save `row_folds` as "{fold_dir}/{name}_{fingerprint}.npy" and return the filepath."""
+    os.makedirs(fold_dir, exist_ok=True)
+    filepath = _folds_filepath(fold_dir, name, fingerprint)
+    np.save(filepath, np.asarray(row_folds, dtype=np.int8))
+    return filepath
+
+
+def load_folds(
+        fold_dir: str,
+        name: str,
+        fingerprint: str,
+        mmap_mode: Optional[str] = 'r') -> np.ndarray:
+    """Load fold assignment saved by `save_folds`.
+
+    Raises
+    ------
+    FileNotFoundError
+        Fold assignment of `name` is not saved for the dataset of `fingerprint`.
+    """
+    return np.load(_folds_filepath(fold_dir, name, fingerprint), mmap_mode=mmap_mode)
+
+
+def _folds_filepath(fold_dir: str, name: str, fingerprint: str) -> str:
+    return os.path.join(fold_dir, f'{name}_{fingerprint}.npy')
@@ -0,0 +1,266 @@
+import hashlib
+import inspect
+import os
+import os.path
+import sysconfig
+import types
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import cross_validation
+import pitching_pattern
+import utils
+from players import GameParticipation, Hand
+
+ROW_FOLD_COLUMN = 'rowFold'
+
+
+class FeatureGroup(NamedTuple):
+    '''Feature group computed by `func(df)` from `inputs` columns and outputs of `depends_on`.'''
+    name: str
+    func: Callable[[pd.DataFrame], pd.DataFrame]
+    inputs: tuple
+    depends_on: tuple
+    version: int = 0
+
+
+FEATURE_GROUPS: Dict[str, FeatureGroup] = {}
+
+
+def feature_group(
+        name: str,
+        inputs: Iterable[str],
+        depends_on: Iterable[str] = (),
+        registry: Optional[Dict[str, FeatureGroup]] = None,
+        version: int = 0) -> Callable:
+    '''Decorator registering a function as feature group `name`.
+
+    The function takes a DataFrame having `inputs` columns of the dataset and the columns of
+    the groups in `depends_on`, and returns a DataFrame of the same index.
+    Increment `version` to invalidate cache for a change which is not in the code, e.g. data
+    files read by the function.
+    '''
+    registry = FEATURE_GROUPS if registry is None else registry
+
+    def register(func: Callable[[pd.DataFrame], pd.DataFrame]) -> Callable:
+        registry[name] = FeatureGroup(
+            name=name, func=func, inputs=tuple(inputs), depends_on=tuple(depends_on),
+            version=version)
+        return func
+    return register
+
+
+class FeatureStore(object):
+    '''Cache of feature groups on disk.
+
+    Output of each group is saved as "{store_dir}/{name}_{key}.pickle", where key is a hash of
+    the code of the group (see `code_fingerprint`), its version, values of its input columns and
+    the keys of the groups it depends on. So a group is recomputed only when its code or inputs
+    change, and the groups depending on it are recomputed too.
+    '''
+
+    def __init__(self, store_dir: str, groups: Optional[Dict[str, FeatureGroup]] = None):
+        self.store_dir = store_dir
+        self.groups = FEATURE_GROUPS if groups is None else groups
+
+    def load(self, names: Iterable[str], data: pd.DataFrame) -> pd.DataFrame:
+        '''Columns of feature groups `names` of `data`, computing only groups not cached.
+
+        Raises
+        ------
+        KeyError
+            Some of `names` or their dependencies are not registered, or `data` lacks inputs.
+        '''
+        keys = {}
+        return pd.concat([self._load(name, data, keys) for name in names], axis=1)
+
+    def key(self, name: str, data: pd.DataFrame) -> str:
+        return self._key(name, data, {})
+
+    def _load(self, name: str, data: pd.DataFrame, keys: dict) -> pd.DataFrame:
+        group = self.groups[name]
+        filepath = os.path.join(self.store_dir, f'{name}_{self._key(name, data, keys)}.pickle')
+        if os.path.isfile(filepath):
+            return pd.read_pickle(filepath)
+        input_ = pd.concat(
+            [data[list(group.inputs)]] + [self._load(d, data, keys) for d in group.depends_on],
+            axis=1)
+        out = group.func(input_)
+        os.makedirs(self.store_dir, exist_ok=True)
+        out.to_pickle(filepath, protocol=-1)
+        return out
+
+    def _key(self, name: str, data: pd.DataFrame, keys: dict) -> str:
+        if name not in keys:
+            group = self.groups[name]
+            sha1 = hashlib.sha1(f'{code_fingerprint(group.func)}:{group.version}'.encode())
+            inputs = [data[c] for c in group.inputs]
+            sha1.update(utils.dataset_fingerprint(data.index, *inputs).encode())
+            for d in group.depends_on:
+                sha1.update(self._key(d, data, keys).encode())
+            keys[name] = sha1.hexdigest()
+        return keys[name]
+
+
+def code_fingerprint(func: Callable) -> str:
+    '''sha1 of the code `func` runs, as far as it can be found statically.
+
+    It covers the source of `func`, the source of functions and classes of its module it refers
+    to, directly or through the others of them, and the whole source files of the modules of this
+    project (not of the standard library or installed packages) any of them refers to, directly or
+    through the modules referred to.
+    '''
+    own_module = inspect.getmodule(func)
+    sources, referred = _own_module_code(func, own_module)
+    sha1 = hashlib.sha1()
+    for source in sources:
+        sha1.update(source.encode())
+    for filepath in sorted(_project_module_files(referred, own_module)):
+        with open(filepath, 'rb') as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def _own_module_code(
+        func: Callable,
+        own_module: Optional[types.ModuleType]) -> Tuple[List[str], List[object]]:
+    '''Sources of `func` and functions and classes of its module reached from it, and objects
+    referred to by them.'''
+    sources, referred = [], []
+    pending, visited = [func], set()
+    while pending:
+        obj = pending.pop()
+        if id(obj) in visited:
+            continue
+        visited.add(id(obj))
+        sources.append(inspect.getsource(obj))
+        functions = [obj] if inspect.isfunction(obj) \
+            else [v for v in vars(obj).values() if inspect.isfunction(v)]
+        for f in functions:
+            for o in _referred_objects(f):
+                referred.append(o)
+                is_code = inspect.isfunction(o) or inspect.isclass(o)
+                if is_code and inspect.getmodule(o) is own_module:
+                    pending.append(o)
+    return sources, referred
+
+
+def _referred_objects(func: Callable) -> List[object]:
+    namespace = dict(func.__globals__)
+    namespace.update(inspect.getclosurevars(func).nonlocals)
+    names = _code_names(func.__code__) | set(func.__code__.co_freevars)
+    return [namespace[n] for n in sorted(names) if n in namespace]
+
+
+def _code_names(code: types.CodeType) -> set:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):  # Nested functions and comprehensions
+            names |= _code_names(const)
+    return names
+
+
+def _project_module_files(
+        referred: Iterable[object],
+        own_module: Optional[types.ModuleType]) -> set:
+    pending = [m for m in map(_module_of, referred) if m is not None and m is not own_module]
+    visited = {}
+    while pending:
+        module = pending.pop()
+        filepath = getattr(module, '__file__', None)
+        if filepath is None or filepath in visited or not _is_project_file(filepath):
+            continue
+        visited[filepath] = module
+        pending += [m for m in map(_module_of, vars(module).values()) if m is not None]
+    return set(visited)
+
+
+def _module_of(obj: object) -> Optional[types.ModuleType]:
+    return obj if inspect.ismodule(obj) else inspect.getmodule(obj)
+
+
+def _is_project_file(filepath: str) -> bool:
+    filepath = os.path.realpath(filepath)
+    paths = sysconfig.get_paths()
+    library_dirs = {
+        os.path.realpath(paths[k]) for k in ('stdlib', 'platstdlib', 'purelib', 'platlib')}
+    return not any(filepath.startswith(d + os.sep) for d in library_dirs)
+
+
+@feature_group('hands', inputs=['pitcherID', 'pitcherHand', 'batterID', 'batterHand'])
+def hands(df: pd.DataFrame) -> pd.DataFrame:
+    out = Hand.is_pitcher_hand_left(df).to_frame()
+    out['isBatterHandLeft'] = Hand.is_batter_hand_left(
+        df.assign(isPitcherHandLeft=out.isPitcherHandLeft))
+    return out
+
+
+@feature_group('participation', inputs=['gameID', 'startDayTime', 'pitcherID', 'batterID'])
+def participation(df: pd.DataFrame) -> pd.DataFrame:
+    out = df[['gameID', 'pitcherID', 'batterID']]
+    participation = GameParticipation(df).hours_elapsed_from_last_all()
+    for role, hours in zip(('pitcher', 'batter'), participation):
+        hours = hours.rename(columns={
+            'hoursElapsed': f'{role}HoursElapsed',
+            'numGamesParticipated': f'{role}NumGamesParticipated'})
+        out = pd.merge(out, hours, on=[f'{role}ID', 'gameID'], how='left').set_axis(df.index)
+    return out.drop(columns=['gameID', 'pitcherID', 'batterID'])
+
+
+@feature_group(
+    'zone_counts',
+    inputs=list(pitching_pattern.AT_BAT_COLUMNS) + ['ballX', 'ballY'])
+def zone_counts(df: pd.DataFrame) -> pd.DataFrame:
+    '''Number of pitches in each `ballXY` zone in the at-bat of each pitch.'''
+    at_bats = df.groupby(list(pitching_pattern.AT_BAT_COLUMNS), sort=False, dropna=False).ngroup()
+    zones = pitching_pattern.zone_codes(df.ballX, df.ballY)
+    return pd.DataFrame(
+        pitching_pattern.zone_counts(at_bats.values, zones),
+        columns=list(pitching_pattern.ZONES),
+        index=df.index)
+
+
+@feature_group(
+    'pitcher_zone_counts',
+    inputs=['pitcherID', 'ballX', 'ballY', ROW_FOLD_COLUMN])
+def pitcher_zone_counts(df: pd.DataFrame) -> pd.DataFrame:
+    '''Number of pitches of the pitcher in each zone, leaving out the validation fold of the row.'''
+    return _player_zone_counts(df, 'pitcher')
+
+
+@feature_group(
+    'batter_zone_counts',
+    inputs=['batterID', 'ballX', 'ballY', ROW_FOLD_COLUMN])
+def batter_zone_counts(df: pd.DataFrame) -> pd.DataFrame:
+    '''Number of pitches to the batter in each zone, leaving out the validation fold of the row.'''
+    return _player_zone_counts(df, 'batter')
+
+
+def assign_row_folds(
+        data: pd.DataFrame,
+        fold_dir: str,
+        name: str,
+        fingerprint: str) -> pd.DataFrame:
+    '''`data` having `ROW_FOLD_COLUMN` loaded by `cross_validation.load_folds`.
+
+    Saved fold assignment is of the first rows of `data`, i.e. training set. Following rows, e.g.
+    test set appended to training set, are `NOT_ASSIGNED`.
+    '''
+    saved = cross_validation.load_folds(fold_dir, name, fingerprint)
+    row_folds = np.full(data.shape[0], utils.NOT_ASSIGNED, dtype=np.int8)
+    row_folds[:saved.shape[0]] = saved
+    return data.assign(**{ROW_FOLD_COLUMN: row_folds})
+
+
+def _player_zone_counts(df: pd.DataFrame, role: str) -> pd.DataFrame:
+    players, _ = pd.factorize(df[f'{role}ID'], use_na_sentinel=False)
+    counts = pitching_pattern.zone_counts(
+        players,
+        pitching_pattern.zone_codes(df.ballX, df.ballY),
+        row_folds=df[ROW_FOLD_COLUMN].values)
+    return pd.DataFrame(
+        counts,
+        columns=[f'{role}Zone_{z}' for z in pitching_pattern.ZONES],
+        index=df.index)
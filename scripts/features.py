@@ -1,3 +1,12 @@
+import json
+from typing import List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils import NOT_ASSIGNED, fold_keys
+
 VECTOR_FEATURES = [
     'ballPositionLabel__no_data__',
     'ど真ん中',
@@ -385,6 +394,8 @@ VECTOR_FEATURES = [
     'ballXYd50'
 ]
 
+COLUMN_INDEX_SUFFIX = '.columns.json'
+
 CATEGORICAL_FEATURES = [
     'batterID',
     'pitcherID',
@@ -397,3 +408,332 @@ CATEGORICAL_FEATURES = [
     'pitcherTeam',
     'b1', 'b2', 'b3'
 ]
+
+HIGH_CARDINALITY_FEATURES = ['batterID', 'pitcherID', 'Match']
+
+
+class OneHotEncoder(object):
+    """One-hot encoder for `CATEGORICAL_FEATURES` giving sparse matrix.
+
+    Columns are the same as `pd.get_dummies(df, columns=columns, drop_first=drop_first)`
+    applied to the dataset given to `fit`, and shared by every dataset given to `transform`.
+    Categories not seen in `fit` are encoded as all zeros.
+    """
+
+    def __init__(
+            self,
+            columns: Optional[List[str]] = None,
+            drop_first: bool = True,
+            dtype: type = np.float32):
+        self.columns = CATEGORICAL_FEATURES if columns is None else columns
+        self.drop_first = drop_first
+        self.dtype = dtype
+
+    def fit(self, df: pd.DataFrame) -> 'OneHotEncoder':
+        self.categories_ = {c: np.sort(df[c].dropna().unique()) for c in self.columns}
+        return self
+
+    def transform(
+            self,
+            df: pd.DataFrame,
+            dense: bool = False) -> Union[sparse.csr_matrix, np.ndarray]:
+        """Encode `df`.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Having `columns`.
+        dense : bool, optional
+            Return dense np.ndarray instead of CSR matrix if True, by default False
+
+        Returns
+        -------
+        encoded : Union[sparse.csr_matrix, np.ndarray]
+            Shape is (df.shape[0], len(get_feature_names())).
+        """
+        if not hasattr(self, 'categories_'):
+            raise AttributeError('Categories are determined after calling `fit`')
+        nrows = df.shape[0]
+        rows, cols = [], []
+        offset = 0
+        for c in self.columns:
+            categories = self.categories_[c]
+            codes = pd.Index(categories).get_indexer(df[c]).astype(np.int64)
+            if self.drop_first:
+                codes -= 1
+            is_hot = codes >= 0
+            rows.append(np.flatnonzero(is_hot))
+            cols.append(codes[is_hot] + offset)
+            offset += categories.size - int(self.drop_first)
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        encoded = sparse.csr_matrix(
+            (np.ones(rows.size, dtype=self.dtype), (rows, cols)),
+            shape=(nrows, offset))
+        return encoded.toarray() if dense else encoded
+
+    def fit_transform(
+            self,
+            df: pd.DataFrame,
+            dense: bool = False) -> Union[sparse.csr_matrix, np.ndarray]:
+        return self.fit(df).transform(df, dense=dense)
+
+    def get_feature_names(self) -> List[str]:
+        if not hasattr(self, 'categories_'):
+            raise AttributeError('Categories are determined after calling `fit`')
+        start = int(self.drop_first)
+        return [f'{c}_{v}' for c in self.columns for v in self.categories_[c][start:]]
+
+
+class TargetEncoder(object):
+    """Per-class rate of the target in each category, smoothed toward the rate of all rows.
+
+    Encoded value of category c for class k is (n_ck + smoothing * p_k) / (n_c + smoothing),
+    where n_ck is the number of rows of category c and class k, n_c = sum_k n_ck, and p_k is the
+    rate of class k. Missing values and categories not seen in `fit` are encoded as p_k.
+    """
+
+    def __init__(
+            self,
+            columns: Optional[List[str]] = None,
+            smoothing: float = 20.,
+            dtype: type = np.float32):
+        self.columns = HIGH_CARDINALITY_FEATURES if columns is None else columns
+        self.smoothing = smoothing
+        self.dtype = dtype
+
+    def fit(self, df: pd.DataFrame, y: np.ndarray) -> 'TargetEncoder':
+        self._fit(df, y, np.full(df.shape[0], NOT_ASSIGNED))
+        return self
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Encode `df`, shape is (df.shape[0], len(columns) * len(classes_))."""
+        if not hasattr(self, 'categories_'):
+            raise AttributeError('Categories are determined after calling `fit`')
+        out = []
+        for c in self.columns:
+            codes = pd.Index(self.categories_[c]).get_indexer(df[c])
+            out.append(self._encode(self.counts_[c], self.class_counts_, codes))
+        return np.hstack(out) if out else np.empty((df.shape[0], 0), dtype=self.dtype)
+
+    def fit_transform_oof(
+            self,
+            df: pd.DataFrame,
+            y: np.ndarray,
+            row_folds: np.ndarray) -> np.ndarray:
+        """Fit on all rows and encode each row of `df` by the rows out of its validation fold.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Having `columns`.
+        y : np.ndarray
+            Target of each row.
+        row_folds : np.ndarray
+            Validation fold of each row, see `cross_validation.row_folds_from_ids`. Rows in no
+            fold are encoded by the rows in folds.
+
+        Returns
+        -------
+        encoded : np.ndarray
+            Same shape as `transform(df)`.
+        """
+        keys, class_counts, counts = self._fit(df, y, row_folds)
+        out = []
+        for c in self.columns:
+            codes, counts_by_fold = counts[c]
+            seen_codes = np.maximum(codes, 0)
+            # Statistics of the rows out of the fold of each row
+            out.append(self._encode(
+                self.counts_[c][seen_codes] - counts_by_fold[keys, seen_codes],
+                self.class_counts_ - class_counts[keys],
+                codes,
+                per_row=True))
+        return np.hstack(out) if out else np.empty((df.shape[0], 0), dtype=self.dtype)
+
+    def get_feature_names(self) -> List[str]:
+        if not hasattr(self, 'classes_'):
+            raise AttributeError('Classes are determined after calling `fit`')
+        return [f'{c}_target{k}' for c in self.columns for k in self.classes_]
+
+    def _fit(self, df: pd.DataFrame, y: np.ndarray, row_folds: np.ndarray) -> tuple:
+        """Count classes of each category in each fold, and keep the sum over folds."""
+        self.classes_, labels = np.unique(np.asarray(y), return_inverse=True)
+        self.categories_ = {c: np.sort(df[c].dropna().unique()) for c in self.columns}
+        num_classes = self.classes_.size
+        keys, num_keys = fold_keys(row_folds)
+        class_counts = np.bincount(keys * num_classes + labels, minlength=num_keys * num_classes) \
+            .reshape(num_keys, num_classes)
+        self.class_counts_ = class_counts.sum(axis=0)
+        self.counts_, counts = {}, {}
+        for c in self.columns:
+            codes = pd.Index(self.categories_[c]).get_indexer(df[c])
+            counts_by_fold = _count_by_fold(
+                codes, self.categories_[c].size, keys, num_keys, labels, num_classes)
+            self.counts_[c] = counts_by_fold.sum(axis=0)
+            counts[c] = (codes, counts_by_fold)
+        return keys, class_counts, counts
+
+    def _encode(
+            self,
+            counts: np.ndarray,
+            class_counts: np.ndarray,
+            codes: np.ndarray,
+            per_row: bool = False) -> np.ndarray:
+        """Smoothed rates given counts of each category (or each row if `per_row`)."""
+        prior = class_counts / np.maximum(class_counts.sum(axis=-1, keepdims=True), 1)
+        if not per_row:
+            counts = counts[np.maximum(codes, 0)]
+        counts = np.where((codes >= 0)[:, np.newaxis], counts, 0)
+        return ((counts + self.smoothing * prior)
+                / (counts.sum(axis=1, keepdims=True) + self.smoothing)).astype(self.dtype)
+
+
+class FrequencyEncoder(object):
+    """Number of rows of each category, divided by the number of rows if `normalize`."""
+
+    def __init__(
+            self,
+            columns: Optional[List[str]] = None,
+            normalize: bool = True,
+            dtype: type = np.float32):
+        self.columns = HIGH_CARDINALITY_FEATURES if columns is None else columns
+        self.normalize = normalize
+        self.dtype = dtype
+
+    def fit(self, df: pd.DataFrame) -> 'FrequencyEncoder':
+        self._fit(df, np.full(df.shape[0], NOT_ASSIGNED))
+        return self
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Encode `df`, shape is (df.shape[0], len(columns)). Missing values are encoded as 0."""
+        if not hasattr(self, 'categories_'):
+            raise AttributeError('Categories are determined after calling `fit`')
+        out = np.zeros((df.shape[0], len(self.columns)), dtype=self.dtype)
+        for j, c in enumerate(self.columns):
+            codes = pd.Index(self.categories_[c]).get_indexer(df[c])
+            counts = np.where(codes >= 0, self.counts_[c][np.maximum(codes, 0)], 0)
+            out[:, j] = counts / self._denominator(self.num_rows_)
+        return out
+
+    def fit_transform_oof(self, df: pd.DataFrame, row_folds: np.ndarray) -> np.ndarray:
+        """Fit on all rows and encode each row of `df` by the rows out of its validation fold.
+
+        See `TargetEncoder.fit_transform_oof`.
+        """
+        keys, num_rows, counts = self._fit(df, row_folds)
+        out = np.zeros((df.shape[0], len(self.columns)), dtype=self.dtype)
+        for j, c in enumerate(self.columns):
+            codes, counts_by_fold = counts[c]
+            is_seen = codes >= 0
+            seen_codes, seen_keys = codes[is_seen], keys[is_seen]
+            num_out_of_fold = self.counts_[c][seen_codes] - counts_by_fold[seen_keys, seen_codes]
+            denominator = self._denominator(self.num_rows_ - num_rows[seen_keys])
+            out[is_seen, j] = num_out_of_fold / denominator
+        return out
+
+    def _fit(self, df: pd.DataFrame, row_folds: np.ndarray) -> tuple:
+        """Count rows of each category in each fold, and keep the sum over folds."""
+        self.categories_ = {c: np.sort(df[c].dropna().unique()) for c in self.columns}
+        keys, num_keys = fold_keys(row_folds)
+        num_rows = np.bincount(keys, minlength=num_keys)
+        self.num_rows_ = num_rows.sum()
+        self.counts_, counts = {}, {}
+        for c in self.columns:
+            codes = pd.Index(self.categories_[c]).get_indexer(df[c])
+            counts_by_fold = _count_by_fold(
+                codes, self.categories_[c].size, keys, num_keys)[:, :, 0]
+            self.counts_[c] = counts_by_fold.sum(axis=0)
+            counts[c] = (codes, counts_by_fold)
+        return keys, num_rows, counts
+
+    def get_feature_names(self) -> List[str]:
+        return [f'{c}_frequency' for c in self.columns]
+
+    def _denominator(self, num_rows: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        return np.maximum(num_rows, 1) if self.normalize else 1
+
+
+def _count_by_fold(
+        codes: np.ndarray,
+        num_codes: int,
+        keys: np.ndarray,
+        num_keys: int,
+        labels: Optional[np.ndarray] = None,
+        num_labels: int = 1) -> np.ndarray:
+    """Number of rows of each (fold key, code, label) in one `np.bincount`, code -1 ignored."""
+    is_seen = codes >= 0
+    labels = np.zeros(codes.size, dtype=np.int64) if labels is None else labels
+    flat = (keys[is_seen] * num_codes + codes[is_seen]) * num_labels + labels[is_seen]
+    return np.bincount(flat, minlength=num_keys * num_codes * num_labels) \
+        .reshape(num_keys, num_codes, num_labels)
+
+
+class FeatureMatrix(NamedTuple):
+    """Dense float32 features, `values[:, j]` is the column `columns[j]`.
+
+    `values` is memory-mapped when loaded by `load_feature_matrix`, so that worker processes
+    opening the same file share its pages. Contiguous row slices are views of the map, while
+    row indices and masks (fancy indexing) copy the selected rows into memory.
+    """
+    values: np.ndarray
+    columns: List[str]
+
+    def column_indices(self, columns: Sequence[str]) -> np.ndarray:
+        """Positions of `columns` in `values`, KeyError if some of them are not there."""
+        indices = pd.Index(self.columns).get_indexer(columns)
+        if (indices < 0).any():
+            raise KeyError(f'Not in feature matrix: {np.asarray(columns)[indices < 0].tolist()}')
+        return indices
+
+    def take(
+            self,
+            rows: Optional[np.ndarray] = None,
+            columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Rows (indices, mask or slice) and columns of `values`, all of them if not given.
+
+        Slices give views of `values`. Indices and masks copy only the selected rows.
+        """
+        values = self.values if rows is None else self.values[rows]
+        return values if columns is None else values[:, self.column_indices(columns)]
+
+
+def save_feature_matrix(
+        filepath: str,
+        df: pd.DataFrame,
+        columns: Optional[List[str]] = None) -> FeatureMatrix:
+    """Save `columns` of `df` as float32 .npy and its column index as "{filepath}.columns.json".
+
+    The matrix is filled column by column in the memory-mapped file, thus no float64 copy of the
+    whole block is made.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of .npy file.
+    df : pd.DataFrame
+        Having `columns`.
+    columns : List[str], optional
+        Columns to be saved, by default `VECTOR_FEATURES`
+
+    Returns
+    -------
+    matrix : FeatureMatrix
+        Memory-mapped to `filepath`.
+    """
+    columns = VECTOR_FEATURES if columns is None else list(columns)
+    values = np.lib.format.open_memmap(
+        filepath, mode='w+', dtype=np.float32, shape=(df.shape[0], len(columns)))
+    for j, c in enumerate(columns):
+        values[:, j] = df[c].to_numpy(dtype=np.float32, na_value=np.nan)
+    values.flush()
+    del values
+    with open(filepath + COLUMN_INDEX_SUFFIX, 'w') as f:
+        json.dump(columns, f, ensure_ascii=False)
+    return load_feature_matrix(filepath)
+
+
+def load_feature_matrix(filepath: str, mmap_mode: Optional[str] = 'r') -> FeatureMatrix:
+    """Load `FeatureMatrix` saved by `save_feature_matrix`."""
+    with open(filepath + COLUMN_INDEX_SUFFIX) as f:
+        columns = json.load(f)
+    return FeatureMatrix(values=np.load(filepath, mmap_mode=mmap_mode), columns=columns)
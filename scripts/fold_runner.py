@@ -0,0 +1,162 @@
+import mmap
+import os
+import os.path
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from sklearn.base import BaseEstimator, clone
+from sklearn.metrics import f1_score
+from sklearn.pipeline import Pipeline
+
+from transformer_cache import TransformerCache, array_fingerprint
+from utils import NOT_ASSIGNED
+
+
+class FoldResult(NamedTuple):
+    '''Output of `run_folds`.
+
+    oof: (n_train, n_classes) predictions of validation folds, nan for rows in no fold.
+    test: (n_test, n_classes) predictions for test set averaged over folds.
+    metrics: macro F1 of each fold, {'train': [...], 'valid': [...]}.
+    models: Fitted estimator of each fold.
+    classes: Class labels associated with columns of `oof` and `test`.
+    '''
+    oof: np.ndarray
+    test: np.ndarray
+    metrics: dict
+    models: List[BaseEstimator]
+    classes: np.ndarray
+
+
+def run_folds(
+        estimator: BaseEstimator,
+        X: np.ndarray,
+        y: np.ndarray,
+        X_test: np.ndarray,
+        row_folds: np.ndarray,
+        n_jobs: Optional[int] = None,
+        evaluate_train: bool = True,
+        cache_dir: Optional[str] = None,
+        feature_names: Optional[List[str]] = None) -> FoldResult:
+    '''Fit and evaluate `estimator` on every fold in parallel.
+
+    `X`, `y`, `X_test` and `row_folds` are written once as .npy files and memory-mapped by
+    worker processes, so that they are not pickled for each fold. Arrays memory-mapped from
+    whole .npy files, e.g. `features.load_feature_matrix(...).values`, are linked, not copied.
+
+    Parameters
+    ----------
+    estimator : BaseEstimator
+        Unfitted estimator, e.g. `Pipeline` of transformers and a classifier.
+        It is cloned for each fold.
+    X, y : np.ndarray
+        Features and target of training set.
+    X_test : np.ndarray
+        Features of test set.
+    row_folds : np.ndarray
+        Validation fold of each row of `X`, see `cross_validation.row_folds_from_ids`.
+    n_jobs : int, optional
+        Number of worker processes, by default min(number of folds, cpu count).
+        Folds are run in this process if 1.
+    evaluate_train : bool, optional
+        Calculate macro F1 of training folds too, by default True
+    cache_dir : str, optional
+        If given and `estimator` is a `Pipeline`, the steps before the last one are fitted via
+        `TransformerCache(cache_dir)`, so that they are not refitted when only the last step
+        changes. Not cached by default.
+    feature_names : List[str], optional
+        Names of columns of `X`, a part of the cache key.
+
+    Returns
+    -------
+    result : FoldResult
+    '''
+    folds = np.unique(row_folds[row_folds != NOT_ASSIGNED])
+    if n_jobs is None:
+        n_jobs = min(folds.size, os.cpu_count() or 1)
+    classes = np.unique(y)
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        arrays = {'X': X, 'y': y, 'X_test': X_test, 'row_folds': row_folds}
+        for name, array in arrays.items():
+            _share(os.path.join(shared_dir, f'{name}.npy'), array)
+        cache = None
+        if cache_dir is not None:
+            cache = (cache_dir, array_fingerprint(X, y, X_test, row_folds), feature_names)
+        args = [(clone(estimator), shared_dir, i, evaluate_train, cache) for i in folds]
+        if n_jobs == 1:
+            outputs = [_run_fold(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                outputs = list(executor.map(_run_fold, *zip(*args)))
+
+    oof = np.full((len(y), classes.size), np.nan)
+    test = np.zeros((len(X_test), classes.size))
+    metrics = {'train': [], 'valid': []}
+    models = []
+    for i, (model, pred_valid, pred_test, score_train, score_valid) in zip(folds, outputs):
+        columns = np.searchsorted(classes, model.classes_)
+        oof[np.ix_(row_folds == i, columns)] = pred_valid
+        test[:, columns] += pred_test / folds.size
+        metrics['train'].append(score_train)
+        metrics['valid'].append(score_valid)
+        models.append(model)
+    return FoldResult(oof=oof, test=test, metrics=metrics, models=models, classes=classes)
+
+
+def _share(filepath: str, array: np.ndarray) -> None:
+    # Memory-map of whole .npy file (not a view of it) is the file itself
+    is_npy_memmap = isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) \
+        and array.filename is not None and array.filename.endswith('.npy')
+    if is_npy_memmap:
+        try:
+            os.symlink(os.path.abspath(array.filename), filepath)
+            return
+        except OSError:  # Symbolic link is not permitted
+            pass
+    np.save(filepath, np.asarray(array))
+
+
+def _run_fold(
+        estimator: BaseEstimator,
+        shared_dir: str,
+        fold: int,
+        evaluate_train: bool,
+        cache: Optional[tuple] = None):
+    X, y, X_test, row_folds = [
+        np.load(os.path.join(shared_dir, f'{name}.npy'), mmap_mode='r')
+        for name in ('X', 'y', 'X_test', 'row_folds')
+    ]
+    is_valid = row_folds == fold
+    train_idx, valid_idx = np.flatnonzero(~is_valid), np.flatnonzero(is_valid)
+    X_train, X_valid = X[train_idx], X[valid_idx]
+    preprocessor = None
+    if cache is not None and isinstance(estimator, Pipeline) and len(estimator.steps) > 1:
+        cache_dir, fingerprint, feature_names = cache
+        preprocessor, (name, estimator) = estimator[:-1], estimator.steps[-1]
+        transformer_cache = TransformerCache(cache_dir)
+        preprocessor, X_train, others = transformer_cache.fit_transform(
+            preprocessor,
+            TransformerCache.key(preprocessor, fold, fingerprint, feature_names),
+            X_train,
+            y[train_idx],
+            others={'valid': X_valid, 'test': X_test})
+        X_valid, X_test = others['valid'], others['test']
+    model = estimator.fit(X_train, y[train_idx])
+    score_train = f1_score(y[train_idx], model.predict(X_train), average='macro') \
+        if evaluate_train else np.nan
+    score_valid = f1_score(y[valid_idx], model.predict(X_valid), average='macro')
+    pred_valid, pred_test = predict_scores(model, X_valid), predict_scores(model, X_test)
+    if preprocessor is not None:
+        model = Pipeline(preprocessor.steps + [(name, model)])
+    return model, pred_valid, pred_test, score_train, score_valid
+
+
+def predict_scores(model: BaseEstimator, X: np.ndarray) -> np.ndarray:
+    '''Class probabilities of `model`, or decision function if it does not predict them.'''
+    try:
+        return model.predict_proba(X)
+    except AttributeError:
+        return model.decision_function(X)
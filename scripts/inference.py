@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator
+
+from fold_runner import predict_scores
+
+ArrayLike = Union[np.ndarray, pd.DataFrame]
+
+
+def predict_test(
+        models: Sequence[BaseEstimator],
+        X_test: ArrayLike,
+        classes: Optional[np.ndarray] = None,
+        batch_size: int = 8192,
+        n_jobs: Optional[int] = None) -> np.ndarray:
+    '''Class probabilities of test set averaged over fold models, predicted batch by batch.
+
+    The output is allocated once and each batch adds predictions of every model into its own rows,
+    thus memory does not grow with the number of models.
+    Batches are predicted by a pool of threads sharing `X_test` and the models.
+
+    Parameters
+    ----------
+    models : Sequence[BaseEstimator]
+        Fitted models of each fold, e.g. `FoldResult.models`.
+    X_test : ArrayLike
+        Features of test set. np.ndarray (it can be memory-mapped) or pd.DataFrame.
+    classes : np.ndarray, optional
+        Class labels associated with columns of output, by default sorted labels of all models.
+        Columns of classes which a model does not know get 0 from that model.
+    batch_size : int, optional
+        Number of rows predicted at once, by default 8192
+    n_jobs : int, optional
+        Number of threads, by default min(number of batches, cpu count).
+
+    Returns
+    -------
+    proba : np.ndarray
+        float32 array of shape (len(X_test), len(classes)).
+    '''
+    if classes is None:
+        classes = np.unique(np.concatenate([m.classes_ for m in models]))
+    columns = [np.searchsorted(classes, m.classes_) for m in models]
+    nrows = X_test.shape[0]
+    proba = np.zeros((nrows, len(classes)), dtype=np.float32)
+    starts = range(0, nrows, batch_size)
+    weight = np.float32(1. / len(models))
+
+    def predict_batch(start: int) -> None:
+        rows = slice(start, min(start + batch_size, nrows))
+        X_batch = X_test.iloc[rows] if isinstance(X_test, pd.DataFrame) else X_test[rows]
+        for model, model_columns in zip(models, columns):
+            proba[rows, model_columns] += weight * predict_scores(model, X_batch).astype(np.float32)
+
+    if n_jobs is None:
+        n_jobs = min(len(starts), os.cpu_count() or 1)
+    if n_jobs <= 1:
+        for start in starts:
+            predict_batch(start)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(predict_batch, starts))
+    return proba
+
+
+def write_submission(
+        filepath: str,
+        ids: Sequence[int],
+        proba: np.ndarray,
+        classes: Optional[np.ndarray] = None,
+        multipliers: Optional[np.ndarray] = None) -> pd.DataFrame:
+    '''Write submission file having `id` and `y`, the class of the highest probability.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of submission, e.g. "submission.csv".
+    ids : Sequence[int]
+        `id` of each row of `proba`.
+    proba : np.ndarray
+        Output of `predict_test`.
+    classes : np.ndarray, optional
+        Class labels associated with columns of `proba`, by default 0, 1, ...
+    multipliers : np.ndarray, optional
+        Multiplier of each class applied before taking the highest, e.g.
+        `postprocessing.ClassMultipliers.multipliers_`.
+
+    Returns
+    -------
+    submission : pd.DataFrame
+        Content of the file, sorted by `id`.
+    '''
+    classes = np.arange(proba.shape[1]) if classes is None else np.asarray(classes)
+    scores = proba if multipliers is None else proba * np.asarray(multipliers)
+    submission = pd.DataFrame({'id': np.asarray(ids), 'y': classes[np.argmax(scores, axis=1)]}) \
+        .sort_values('id') \
+        .reset_index(drop=True)
+    submission.to_csv(filepath, index=False)
+    return submission
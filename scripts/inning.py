@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -17,3 +18,33 @@ class Inning(object):
             else:
                 raise ValueError(f"`inning` format is invalid: {inning}")
         return pd.Series({'inningNo': no, 'isBottom': is_bottom})
+
+    @classmethod
+    def extract_info_column(cls, innings: pd.Series) -> pd.DataFrame:
+        """`extract_info` for whole `inning` column.
+
+        Each distinct value is parsed only once and the result is broadcasted to all rows.
+
+        Parameters
+        ----------
+        innings : pd.Series
+            `inning` column, e.g. "1回表", "12回裏".
+
+        Returns
+        -------
+        inning_info : pd.DataFrame
+            Having 2 int8 columns, `inningNo` and `isBottom`, with the same index as `innings`.
+        """
+        codes, uniques = pd.factorize(innings)
+        if (codes < 0).any():
+            raise ValueError(f"`inning` format is invalid: {innings[codes < 0].iloc[0]}")
+        parsed = np.array(
+            [cls.extract_info(inning).values for inning in uniques], dtype=np.int8
+        ).reshape(-1, 2)
+        return pd.DataFrame(
+            {
+                'inningNo': parsed[codes, 0],
+                'isBottom': parsed[codes, 1],
+            },
+            index=innings.index
+        )
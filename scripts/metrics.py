@@ -0,0 +1,57 @@
+from typing import Optional
+
+import numpy as np
+
+
+def confusion_matrices(y_true: np.ndarray, y_preds: np.ndarray, num_classes: int) -> np.ndarray:
+    '''Confusion matrix of each prediction in one `np.bincount`.
+
+    Parameters
+    ----------
+    y_true : np.ndarray
+        Integer class (0, 1, ..., `num_classes` - 1) of each row, shape is (n,).
+    y_preds : np.ndarray
+        Predicted classes of candidates, shape is (n_candidates, n) or (n,).
+    num_classes : int
+        Number of classes.
+
+    Returns
+    -------
+    matrices : np.ndarray
+        Shape is (n_candidates, num_classes, num_classes), [i, true, pred] is the number of rows.
+    '''
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_preds = np.atleast_2d(np.asarray(y_preds, dtype=np.int64))
+    num_candidates = y_preds.shape[0]
+    candidates = np.arange(num_candidates)[:, np.newaxis]
+    flat = (candidates * num_classes + y_true) * num_classes + y_preds
+    return np.bincount(flat.ravel(), minlength=num_candidates * num_classes ** 2) \
+        .reshape(num_candidates, num_classes, num_classes)
+
+
+def macro_f1_from_confusion(matrices: np.ndarray) -> np.ndarray:
+    '''Macro F1 of each confusion matrix of shape (..., num_classes, num_classes).
+
+    Same as `sklearn.metrics.f1_score(average='macro')`, which averages over classes appearing in
+    either of true or predicted classes and regards F1 of a class without true positive as 0.
+    '''
+    return macro_f1_from_counts(
+        np.diagonal(matrices, axis1=-2, axis2=-1), matrices.sum(axis=-1), matrices.sum(axis=-2))
+
+
+def macro_f1_from_counts(tp: np.ndarray, num_true: np.ndarray, num_pred: np.ndarray) -> np.ndarray:
+    '''Macro F1 given true positives, true and predicted rows of each class on the last axis.'''
+    denominator = num_true + num_pred
+    f1 = np.divide(2 * tp, denominator, out=np.zeros(tp.shape), where=denominator > 0)
+    num_appearing = (denominator > 0).sum(axis=-1)
+    return f1.sum(axis=-1) / np.maximum(num_appearing, 1)
+
+
+def macro_f1(
+        y_true: np.ndarray,
+        y_preds: np.ndarray,
+        num_classes: Optional[int] = None) -> np.ndarray:
+    '''Macro F1 of each candidate of `y_preds`, see `confusion_matrices`.'''
+    if num_classes is None:
+        num_classes = int(max(np.max(y_true), np.max(y_preds))) + 1
+    return macro_f1_from_confusion(confusion_matrices(y_true, y_preds, num_classes))
@@ -1,8 +1,18 @@
+from typing import Dict, NamedTuple, Optional, Tuple
 
-
+import numpy as np
 import pandas as pd
 
+from utils import fold_keys
+
 NO_RECORD = '__NO_DATA__'
+NO_RECORD_ID = 0
+AT_BAT_COLUMNS = ('gameID', 'inning', 'pitcherID', 'batterID', 'O')
+PATTERN_COLUMNS = ('ballPositionLabel', 'pitchType', 'ballXY')
+BALL_X_VALUES = tuple(range(1, 22))
+BALL_Y_VALUES = tuple('abcdefghijk')
+ZONES = tuple(f'{x}{y}' for x in BALL_X_VALUES for y in BALL_Y_VALUES)  # Same as `ballXY`
+NO_ZONE = -1
 
 
 def ballXY(df: pd.DataFrame) -> pd.Series:
@@ -12,6 +22,66 @@ def ballXY(df: pd.DataFrame) -> pd.Series:
     )
 
 
+def zone_codes(ball_x: pd.Series, ball_y: pd.Series) -> np.ndarray:
+    """Integer code of `ballXY`, index of `ZONES` or `NO_ZONE` if missing or out of the grid.
+
+    `ball_y` is case-insensitive, e.g. "A" and "a" are the same row of the grid.
+    """
+    x = pd.Index(BALL_X_VALUES).get_indexer(pd.to_numeric(ball_x, errors='coerce'))
+    y = pd.Index(BALL_Y_VALUES).get_indexer(pd.Series(ball_y).astype(object).str.lower())
+    return np.where((x >= 0) & (y >= 0), x * len(BALL_Y_VALUES) + y, NO_ZONE).astype(np.int16)
+
+
+def zone_histograms(
+        entities: np.ndarray,
+        zones: np.ndarray,
+        num_entities: Optional[int] = None) -> np.ndarray:
+    """Number of pitches in each zone of each entity, shape is (num_entities, len(ZONES)).
+
+    Parameters
+    ----------
+    entities : np.ndarray
+        Non-negative integer entity of each pitch, e.g. `batterID`, `pitcherID` or at-bat number.
+    zones : np.ndarray
+        `zone_codes` of each pitch. Pitches of `NO_ZONE` are not counted.
+    num_entities : int, optional
+        Number of rows of histograms, by default max of `entities` + 1
+    """
+    entities, zones = np.asarray(entities, dtype=np.int64), np.asarray(zones, dtype=np.int64)
+    if num_entities is None:
+        num_entities = int(entities.max()) + 1 if entities.size else 0
+    is_valid = zones != NO_ZONE
+    return np.bincount(
+        entities[is_valid] * len(ZONES) + zones[is_valid],
+        minlength=num_entities * len(ZONES)
+    ).reshape(num_entities, len(ZONES)).astype(np.int32)
+
+
+def zone_counts(
+        entities: np.ndarray,
+        zones: np.ndarray,
+        row_folds: Optional[np.ndarray] = None) -> np.ndarray:
+    """Zone histogram of the entity of each pitch, shape is (len(entities), len(ZONES)).
+
+    If `row_folds` (see `cross_validation.load_folds`) is given, the pitches in the same
+    validation fold are left out of the histogram of each pitch, so that the counts of validation
+    rows come from training folds only. Rows in no fold get the histogram of all pitches.
+    All folds are counted in one `np.bincount` call on (fold, entity, zone) key.
+    """
+    entities, zones = np.asarray(entities, dtype=np.int64), np.asarray(zones, dtype=np.int64)
+    num_entities = int(entities.max()) + 1 if entities.size else 0
+    if row_folds is None:
+        return zone_histograms(entities, zones, num_entities)[entities]
+    keys, num_keys = fold_keys(row_folds)
+    by_fold = zone_histograms(keys * num_entities + entities, zones, num_keys * num_entities) \
+        .reshape(num_keys, num_entities, len(ZONES))
+    total = by_fold.sum(axis=0)
+    out = total[entities]
+    is_assigned = keys > 0
+    out[is_assigned] -= by_fold[keys[is_assigned], entities[is_assigned]]
+    return out
+
+
 def extract_patterns(df: pd.DataFrame) -> dict:
     assert(df.gameID.nunique() == 1)
     assert(df.inning.nunique() == 1)
@@ -24,8 +94,7 @@ def extract_patterns(df: pd.DataFrame) -> dict:
     # the value there should be filled with a specific value.
     out = {}
     max_count = df.totalPitchingCount.max()
-    target_columns = ('ballPositionLabel', 'pitchType', 'ballXY')
-    for c in target_columns:
+    for c in PATTERN_COLUMNS:
         mapping = dict(
             zip(
                 df.totalPitchingCount.tolist(),
@@ -36,3 +105,133 @@ def extract_patterns(df: pd.DataFrame) -> dict:
                          for i in range(1, max_count + 1)]
         out[c] = ' '.join(orderd_values)
     return out
+
+
+class TokenSequences(NamedTuple):
+    """Ragged integer sequences of one pattern column.
+
+    Sequence of `i`-th at-bat is `values[offsets[i]:offsets[i + 1]]`, and each value is an index
+    of `vocabulary`. `vocabulary[NO_RECORD_ID]` is `NO_RECORD`.
+    """
+    vocabulary: np.ndarray
+    offsets: np.ndarray
+    values: np.ndarray
+
+    def join(self) -> np.ndarray:
+        """Space-joined strings of each sequence, same as `extract_patterns`."""
+        tokens = self.vocabulary[self.values] + self._separators()
+        if self.offsets.size <= 1:
+            return np.empty(0, dtype=object)
+        return np.add.reduceat(tokens, self.offsets[:-1])
+
+    def counts(self) -> np.ndarray:
+        """Number of each token in each sequence, shape is (n_sequences, len(vocabulary))."""
+        num_sequences, num_tokens = self.offsets.size - 1, self.vocabulary.size
+        sequence_ids = np.repeat(np.arange(num_sequences), np.diff(self.offsets))
+        return np.bincount(
+            sequence_ids * num_tokens + self.values,
+            minlength=num_sequences * num_tokens
+        ).reshape(num_sequences, num_tokens).astype(np.int32)
+
+    def _separators(self) -> np.ndarray:
+        # Separator follows every value but the last one in each sequence
+        separators = np.full(self.values.size, ' ', dtype=object)
+        separators[self.offsets[1:] - 1] = ''
+        return separators
+
+
+def extract_patterns_all(df: pd.DataFrame) -> pd.DataFrame:
+    """`extract_patterns` for all at-bats in one pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Pitch table having `AT_BAT_COLUMNS`, `totalPitchingCount` and `PATTERN_COLUMNS`.
+
+    Returns
+    -------
+    patterns : pd.DataFrame
+        1 row per 1 at-bat sorted by `AT_BAT_COLUMNS`, having `AT_BAT_COLUMNS` and
+        `PATTERN_COLUMNS`. Values of `PATTERN_COLUMNS` are the same as `extract_patterns`.
+        Rows having missing `AT_BAT_COLUMNS` are kept, see `extract_pattern_sequences`.
+    """
+    out, sequences = extract_pattern_sequences(df)
+    for c in PATTERN_COLUMNS:
+        out[c] = sequences[c].join()
+    return out
+
+
+def extract_pattern_sequences(
+        df: pd.DataFrame,
+        vocabularies: Optional[Dict[str, np.ndarray]] = None) -> Tuple[pd.DataFrame, dict]:
+    """Integer token sequences of all at-bats, instead of space-joined strings.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Pitch table having `AT_BAT_COLUMNS`, `totalPitchingCount` and `PATTERN_COLUMNS`.
+    vocabularies : Dict[str, np.ndarray], optional
+        `TokenSequences.vocabulary` of each column to be reused, e.g. the one built from training
+        set. Values which are not in it are regarded as `NO_RECORD`.
+        If not given, vocabulary is built from `df`.
+
+    Returns
+    -------
+    (at_bats, sequences) : Tuple[pd.DataFrame, dict]
+        at_bats has `AT_BAT_COLUMNS`, 1 row per 1 at-bat sorted by `AT_BAT_COLUMNS`.
+        Missing value of `AT_BAT_COLUMNS` is grouped as a value of its own and sorted last.
+        sequences is a dict of `TokenSequences` whose keys are `PATTERN_COLUMNS`.
+        Missing values in `df` are regarded as `NO_RECORD`.
+    """
+    slots = _pattern_slots(df)
+    at_bats = df[list(AT_BAT_COLUMNS)].iloc[slots['first_rows']].reset_index(drop=True)
+    offsets = np.append(slots['starts'], slots['length'])
+    sequences = {}
+    for c in PATTERN_COLUMNS:
+        observed = df[c].to_numpy(dtype=object)[slots['rows']]
+        if vocabularies is not None and c in vocabularies:
+            vocabulary = np.asarray(vocabularies[c], dtype=object)
+            ids = pd.Index(vocabulary).get_indexer(observed)
+        else:
+            # `NO_RECORD` comes first thus its id is `NO_RECORD_ID`
+            ids, vocabulary = pd.factorize(np.append(np.array([NO_RECORD], dtype=object), observed))
+            ids, vocabulary = ids[1:], np.asarray(vocabulary, dtype=object)
+        ids[ids < 0] = NO_RECORD_ID
+        values = np.full(slots['length'], NO_RECORD_ID, dtype=np.int32)
+        values[slots['positions']] = ids
+        sequences[c] = TokenSequences(vocabulary=vocabulary, offsets=offsets, values=values)
+    return at_bats, sequences
+
+
+def _pattern_slots(df: pd.DataFrame) -> dict:
+    """Layout of pitches when all at-bats are concatenated in `totalPitchingCount` order.
+
+    At-bat `i` occupies `[starts[i], ends[i])`, whose length is its last `totalPitchingCount`.
+    Row `rows[j]` of `df` goes to `positions[j]`; if `totalPitchingCount` is duplicated in an
+    at-bat, the last row wins as in `extract_patterns`.
+    Missing value of `AT_BAT_COLUMNS` is a key of its own, e.g. pitches of unknown `O` in the same
+    game, inning, pitcher and batter are one at-bat, which is sorted after the others.
+    """
+    at_bat = df.groupby(list(AT_BAT_COLUMNS), sort=True, dropna=False).ngroup().to_numpy()
+    counts = df.totalPitchingCount.to_numpy(dtype=np.int64)
+    if (counts < 1).any():
+        raise ValueError('`totalPitchingCount` must be positive')
+    num_at_bats = at_bat.max() + 1 if at_bat.size > 0 else 0
+    lengths = np.zeros(num_at_bats, dtype=np.int64)
+    np.maximum.at(lengths, at_bat, counts)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    positions = starts[at_bat] + counts - 1
+    # Keep last occurrence of each position
+    reversed_unique, reversed_rows = np.unique(positions[::-1], return_index=True)
+    rows = positions.size - 1 - reversed_rows
+    first_rows = np.empty(num_at_bats, dtype=np.int64)
+    first_rows[at_bat] = np.arange(at_bat.size)  # Any row of each at-bat
+    return {
+        'length': int(ends[-1]) if num_at_bats > 0 else 0,
+        'starts': starts,
+        'ends': ends,
+        'positions': reversed_unique,
+        'rows': rows,
+        'first_rows': first_rows,
+    }
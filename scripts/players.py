@@ -1,5 +1,5 @@
-from functools import partial
-from typing import List, Tuple
+import pickle
+from typing import Iterable, List, Tuple
 
 import numpy as np
 import pandas as pd
@@ -13,9 +13,14 @@ class PlayersID(object):
     '''
     TRANSFERRED_PLAYERS = ('ＤＪ．ジョンソン', '澤村 拓一', '小林 慶祐')
 
-    def __init__(self, pitchers: pd.DataFrame, batters: pd.DataFrame):
+    def __init__(
+            self,
+            pitchers: pd.DataFrame,
+            batters: pd.DataFrame,
+            transferred_players: Iterable[str] = TRANSFERRED_PLAYERS):
         self.pitchers = pitchers[['pitcher', 'pitcherTeam']]
         self.batters = batters[['batter', 'batterTeam']]
+        self.transferred_players = tuple(transferred_players)
 
     def assign(self) -> pd.DataFrame:
         """Assign identifier for all players.
@@ -35,13 +40,11 @@ class PlayersID(object):
             .reset_index(drop=True)
         # Assing ID
         player_id['playerID'] = player_id.index
-        for p in self.TRANSFERRED_PLAYERS:
-            player_mask = player_id.player == p
-            one_id = player_id.loc[player_mask, 'playerID'].min()
-            if np.isnan(one_id):
-                continue
-            else:
-                player_id.loc[player_mask, 'playerID'] = one_id
+        is_transferred = player_id.player.isin(self.transferred_players)
+        player_id.loc[is_transferred, 'playerID'] = player_id[is_transferred] \
+            .groupby('player') \
+            .playerID \
+            .transform('min')
         return player_id
 
     @staticmethod
@@ -69,84 +72,328 @@ class PlayersID(object):
         return sorted(list(train_only)), sorted(list(test_only)), sorted(list(shared))
 
 
+class PlayerRegistry(object):
+    """Persisted mapping of (player, team) to `playerID`.
+
+    IDs are assigned in append-only manner, thus they never change once assigned and
+    encodings or models keyed on `batterID`/`pitcherID` stay valid across runs.
+    A player in `transferred_players` has only 1 ID across teams.
+    """
+
+    def __init__(self, transferred_players: Iterable[str] = PlayersID.TRANSFERRED_PLAYERS):
+        self.transferred_players = tuple(transferred_players)
+        self._ids = {}
+        self._index = None
+        self._values = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @classmethod
+    def from_player_ids(
+            cls,
+            player_ids: pd.DataFrame,
+            transferred_players: Iterable[str] = PlayersID.TRANSFERRED_PLAYERS) -> 'PlayerRegistry':
+        """Registry having the same IDs as `player_ids`, output of `PlayersID.assign`."""
+        registry = cls(transferred_players=transferred_players)
+        registry._ids = dict(zip(
+            zip(player_ids.player.tolist(), player_ids.team.tolist()),
+            player_ids.playerID.tolist()))
+        return registry
+
+    def register(self, players: pd.Series, teams: pd.Series) -> None:
+        """Assign new IDs to (player, team) pairs not registered yet.
+
+        New pairs are numbered from max ID + 1 in (team, player) order.
+        """
+        pairs = pd.DataFrame({'player': np.asarray(players), 'team': np.asarray(teams)}) \
+            .drop_duplicates() \
+            .sort_values(['team', 'player'])
+        next_id = max(self._ids.values()) + 1 if self._ids else 0
+        aliases = {p: i for (p, _), i in self._ids.items() if p in self.transferred_players}
+        for player, team in zip(pairs.player.tolist(), pairs.team.tolist()):
+            if (player, team) in self._ids:
+                continue
+            if player in aliases:
+                self._ids[(player, team)] = aliases[player]
+                continue
+            self._ids[(player, team)] = next_id
+            if player in self.transferred_players:
+                aliases[player] = next_id
+            next_id += 1
+        self._index = None
+
+    def map(self, players: pd.Series, teams: pd.Series) -> pd.Series:
+        """`playerID` of each (player, team) pair.
+
+        Raises
+        ------
+        KeyError
+            Some of the pairs are not registered.
+        """
+        if self._index is None:
+            keys = list(self._ids.keys())
+            self._index = pd.MultiIndex.from_tuples(keys, names=['player', 'team']) \
+                if keys else pd.MultiIndex.from_arrays([[], []], names=['player', 'team'])
+            self._values = np.array(list(self._ids.values()), dtype=np.int64)
+        positions = self._index.get_indexer(
+            pd.MultiIndex.from_arrays([np.asarray(players), np.asarray(teams)]))
+        if (positions < 0).any():
+            i = np.flatnonzero(positions < 0)[0]
+            raise KeyError(f'Not registered: ({np.asarray(players)[i]}, {np.asarray(teams)[i]})')
+        index = players.index if isinstance(players, pd.Series) else None
+        return pd.Series(self._values[positions], index=index, name='playerID')
+
+    def assign(self, players: pd.Series, teams: pd.Series) -> pd.Series:
+        """`register` and `map`."""
+        self.register(players, teams)
+        return self.map(players, teams)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Having 3 columns, `player`, `team` and `playerID`, same as `PlayersID.assign`."""
+        return pd.DataFrame({
+            'player': [p for p, _ in self._ids.keys()],
+            'team': [t for _, t in self._ids.keys()],
+            'playerID': list(self._ids.values()),
+        })
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, 'wb') as f:
+            pickle.dump(
+                {'ids': self._ids, 'transferred_players': self.transferred_players}, f, protocol=-1)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'PlayerRegistry':
+        with open(filepath, 'rb') as f:
+            saved = pickle.load(f)
+        registry = cls(transferred_players=saved['transferred_players'])
+        registry._ids = saved['ids']
+        return registry
+
+
 class Hand(object):
     LEFT = 1
     RIGHT = 0
 
     @classmethod
     def is_pitcher_hand_left(cls, pitchers: pd.DataFrame) -> pd.Series:
-        pitcher_ids = pitchers.pitcherID.unique()
-        mode_list = [
-            cls.LEFT
-            if pitchers.query(f'pitcherID == {id_}').pitcherHand.mode()[0] == 'L' else cls.RIGHT
-            for id_ in pitcher_ids]
-        most_frequent_hand = dict(zip(pitcher_ids, mode_list))
-        return pitchers \
-            .pitcherID \
-            .apply(lambda id_: most_frequent_hand[id_]) \
-            .rename('isPitcherHandLeft')
+        """Most frequent `pitcherHand` of each `pitcherID` (left if tied).
+
+        Parameters
+        ----------
+        pitchers : pd.DataFrame
+            Having `pitcherID` and `pitcherHand` ("L", "R" or missing).
+
+        Returns
+        -------
+        is_pitcher_hand_left : pd.Series
+            1 (left) or 0 (right) for each row of `pitchers`.
+        """
+        num_left, num_right = cls._count_hands(pitchers.pitcherID, pitchers.pitcherHand)
+        return pd.Series(
+            cls.pitcher_hand_from_counts(num_left, num_right),
+            index=pitchers.index,
+            name='isPitcherHandLeft')
 
     @classmethod
     def is_batter_hand_left(cls, batters: pd.DataFrame) -> pd.Series:
+        """Batting side of each row.
+
+        Batters who have only one of "L" or "R" in `batterHand` bats on that side.
+        The others are regarded as switch hitters, who bat on the opposite side of the pitcher.
+
+        Parameters
+        ----------
+        batters : pd.DataFrame
+            Having `batterID`, `batterHand` ("L", "R" or missing) and `isPitcherHandLeft`.
+
+        Returns
+        -------
+        is_batter_hand_left : pd.Series
+            1 (left) or 0 (right) for each row of `batters`.
+        """
+        num_left, num_right = cls._count_hands(batters.batterID, batters.batterHand)
+        return pd.Series(
+            cls.batter_hand_from_counts(num_left, num_right, batters.isPitcherHandLeft.values),
+            index=batters.index,
+            name='isBatterHandLeft')
 
-        def _impute_batter_hand(
-                s: pd.Series,
-                num_unique_hand: dict,
-                most_frequent_hand: dict,
-                left: int,
-                right: int) -> int:
-            num_unique = num_unique_hand[s.batterID]
-            if num_unique == 1:  # one of right or left
-                most_frequent_hand = most_frequent_hand[s.batterID][0]
-                return right if most_frequent_hand == 'R' else left
-            else:  # both
-                return right if s.isPitcherHandLeft == left else left
-
-        num_unique_hand = dict(batters.groupby('batterID').batterHand.nunique())
-        batter_ids = batters.batterID.unique()
-        mode_list = [batters.query(f'batterID == {id_}').batterHand.mode() for id_ in batter_ids]
-        most_frequent_hand = dict(zip(batter_ids, mode_list))
-        impute_func = partial(
-            _impute_batter_hand,
-            num_unique_hand=num_unique_hand,
-            most_frequent_hand=most_frequent_hand,
-            left=cls.LEFT,
-            right=cls.RIGHT)
-        return batters.apply(impute_func, axis=1).rename('isBatterHandLeft')
+    @classmethod
+    def pitcher_hand_from_counts(cls, num_left: np.ndarray, num_right: np.ndarray) -> np.ndarray:
+        """Rule of `is_pitcher_hand_left` given the number of "L" and "R" of each pitcher."""
+        return np.where(num_left >= num_right, cls.LEFT, cls.RIGHT)
+
+    @classmethod
+    def batter_hand_from_counts(
+            cls,
+            num_left: np.ndarray,
+            num_right: np.ndarray,
+            is_pitcher_hand_left: np.ndarray) -> np.ndarray:
+        """Rule of `is_batter_hand_left` given the number of "L" and "R" of each batter."""
+        is_switch_hitter = (num_left > 0) == (num_right > 0)
+        opposite_of_pitcher = np.where(is_pitcher_hand_left == cls.LEFT, cls.RIGHT, cls.LEFT)
+        return np.where(
+            is_switch_hitter,
+            opposite_of_pitcher,
+            np.where(num_left > 0, cls.LEFT, cls.RIGHT))
+
+    @staticmethod
+    def count_hands(ids: pd.Series, hands: pd.Series) -> pd.DataFrame:
+        """Number of "L" and "R" of each player, indexed by `ids`."""
+        return pd.DataFrame({'L': hands.eq('L').values, 'R': hands.eq('R').values}) \
+            .groupby(ids.values) \
+            .sum() \
+            .rename_axis(ids.name)
+
+    @staticmethod
+    def _count_hands(ids: pd.Series, hands: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Number of "L" and "R" of the player in each row, counted in one groupby pass."""
+        counts = pd.DataFrame({'L': hands.eq('L').values, 'R': hands.eq('R').values}) \
+            .groupby(ids.values) \
+            .transform('sum')
+        return counts['L'].values, counts['R'].values
 
 
 class GameParticipation(object):
 
     def __init__(self, data: pd.DataFrame):
         self.data = data[['gameID', 'startDayTime', 'pitcherID', 'batterID']]
+        if not pd.api.types.is_datetime64_any_dtype(self.data.startDayTime):
+            self.data = self.data.assign(startDayTime=pd.to_datetime(self.data.startDayTime))
 
     def hours_elapsed_from_last(self, calc_pitcher: bool = True) -> pd.DataFrame:
-        if calc_pitcher:
-            data = self.data[['gameID', 'startDayTime', 'pitcherID']] \
-                .rename(columns={'pitcherID': 'playerID'})
-        else:
-            data = self.data[['gameID', 'startDayTime', 'batterID']] \
-                .rename(columns={'batterID': 'playerID'})
-        data = data.drop_duplicates(subset=['gameID', 'playerID'])
-        data['startDayTime'] = pd.to_datetime(data.startDayTime)
-        # calculate interval by `playerID`
-        list_startdaytime = []
+        """Hours elapsed from the last game and number of games participated so far.
+
+        Parameters
+        ----------
+        calc_pitcher : bool, optional
+            Calculate for pitchers if True, otherwise for batters, by default True
+
+        Returns
+        -------
+        out_df : pd.DataFrame
+            Having 4 columns, `pitcherID` (or `batterID`), `gameID`, `hoursElapsed` and
+            `numGamesParticipated`. 1 row per 1 player and game, sorted by player and game.
+        """
+        id_column = 'pitcherID' if calc_pitcher else 'batterID'
+        data = self.data.loc[
+            ~self.data.duplicated(subset=['gameID', id_column]),
+            [id_column, 'gameID', 'startDayTime']
+        ]
+        # calculate interval by player
         sec_to_hour = 3600
-        for _, player_df in data.groupby('playerID'):
-            player_df.sort_values('startDayTime', inplace=True)
-            player_df['Previous'] = player_df.startDayTime.shift(1)
-            player_df['Delta'] = player_df.startDayTime - player_df.Previous
-            player_df['hoursElapsed'] = player_df \
-                .Delta \
-                .apply(lambda x: x.total_seconds() / sec_to_hour)
-            player_df['numGamesParticipated'] = player_df.reset_index().index + 1
-            list_startdaytime.append(player_df)
-        out_df = pd.concat(list_startdaytime) \
-            .sort_values(['playerID', 'gameID']) \
-            .loc[:, ['playerID', 'gameID', 'hoursElapsed', 'numGamesParticipated']] \
+        data.sort_values([id_column, 'startDayTime'], inplace=True)
+        grouped = data.groupby(id_column, sort=False)
+        data['hoursElapsed'] = grouped.startDayTime.diff().dt.total_seconds() / sec_to_hour
+        data['numGamesParticipated'] = grouped.cumcount() + 1
+        return data \
+            .drop(columns='startDayTime') \
+            .sort_values([id_column, 'gameID']) \
             .reset_index(drop=True)
-        if calc_pitcher:
-            out_df.rename(columns={'playerID': 'pitcherID'}, inplace=True)
-        else:
-            out_df.rename(columns={'playerID': 'batterID'}, inplace=True)
+
+    def hours_elapsed_from_last_all(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """`hours_elapsed_from_last` for both of pitchers and batters.
+
+        Returns
+        -------
+        (pitchers, batters) : Tuple[pd.DataFrame, pd.DataFrame]
+            Same as `hours_elapsed_from_last(calc_pitcher=True)` and `(calc_pitcher=False)`.
+        """
+        return self.hours_elapsed_from_last(calc_pitcher=True), \
+            self.hours_elapsed_from_last(calc_pitcher=False)
+
+
+class PlayerState(object):
+    """Group-level state of players carried across chunks of pitch-by-pitch data.
+
+    Hand counts give the same result as `Hand` over all chunks added so far.
+    Chunks given to `hours_elapsed_from_last` must be in `startDayTime` order, then the result
+    is the same as `GameParticipation` over all of them.
+    """
+    ID_COLUMNS = ('pitcherID', 'batterID')
+
+    def __init__(self):
+        self.hand_counts = {
+            c: pd.DataFrame({'L': [], 'R': []}, dtype=np.int64).rename_axis(c)
+            for c in self.ID_COLUMNS}
+        self.last_games = {
+            c: pd.DataFrame({
+                'startDayTime': pd.Series(dtype='datetime64[ns]'),
+                'numGamesParticipated': pd.Series(dtype=np.int64)
+            }).rename_axis(c)
+            for c in self.ID_COLUMNS}
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, 'wb') as f:
+            pickle.dump(
+                {'hand_counts': self.hand_counts, 'last_games': self.last_games}, f, protocol=-1)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'PlayerState':
+        with open(filepath, 'rb') as f:
+            saved = pickle.load(f)
+        state = cls()
+        state.hand_counts = saved['hand_counts']
+        state.last_games = saved['last_games']
+        return state
+
+    def add_hand_counts(self, id_column: str, counts: pd.DataFrame) -> None:
+        """Add the number of "L" and "R" of each player, e.g. output of `Hand.count_hands`."""
+        self.hand_counts[id_column] = self.hand_counts[id_column] \
+            .add(counts[['L', 'R']], fill_value=0) \
+            .astype(np.int64) \
+            .rename_axis(id_column)
+
+    def is_pitcher_hand_left(self, pitcher_ids: pd.Series) -> pd.Series:
+        """Same as `Hand.is_pitcher_hand_left` with hand counts added so far."""
+        num_left, num_right = self._lookup_hand_counts('pitcherID', pitcher_ids)
+        return pd.Series(
+            Hand.pitcher_hand_from_counts(num_left, num_right),
+            index=pitcher_ids.index,
+            name='isPitcherHandLeft')
+
+    def is_batter_hand_left(
+            self,
+            batter_ids: pd.Series,
+            is_pitcher_hand_left: pd.Series) -> pd.Series:
+        """Same as `Hand.is_batter_hand_left` with hand counts added so far."""
+        num_left, num_right = self._lookup_hand_counts('batterID', batter_ids)
+        return pd.Series(
+            Hand.batter_hand_from_counts(num_left, num_right, is_pitcher_hand_left.values),
+            index=batter_ids.index,
+            name='isBatterHandLeft')
+
+    def hours_elapsed_from_last(
+            self,
+            data: pd.DataFrame,
+            calc_pitcher: bool = True) -> pd.DataFrame:
+        """`GameParticipation.hours_elapsed_from_last` continued from the last games in the state.
+
+        The last game of each player in `data` is recorded in the state.
+        """
+        id_column = 'pitcherID' if calc_pitcher else 'batterID'
+        game_participation = GameParticipation(data)
+        out_df = game_participation.hours_elapsed_from_last(calc_pitcher=calc_pitcher)
+        start = out_df.gameID.map(
+            game_participation.data.drop_duplicates('gameID').set_index('gameID').startDayTime)
+        last_games = self.last_games[id_column].reindex(out_df[id_column].values)
+        is_first = (out_df.numGamesParticipated == 1).values
+        out_df.loc[is_first, 'hoursElapsed'] = \
+            (start.values[is_first] - last_games.startDayTime.values[is_first]) \
+            / np.timedelta64(1, 'h')
+        out_df['numGamesParticipated'] += \
+            last_games.numGamesParticipated.fillna(0).values.astype(np.int64)
+        # Record the last game
+        latest = out_df.assign(startDayTime=start.values) \
+            .sort_values('numGamesParticipated') \
+            .drop_duplicates(subset=id_column, keep='last') \
+            .set_index(id_column)[['startDayTime', 'numGamesParticipated']]
+        self.last_games[id_column] = pd.concat([
+            self.last_games[id_column].drop(index=latest.index, errors='ignore'),
+            latest
+        ]).rename_axis(id_column)
         return out_df
+
+    def _lookup_hand_counts(self, id_column: str, ids: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        counts = self.hand_counts[id_column].reindex(ids.values, fill_value=0)
+        return counts['L'].values, counts['R'].values
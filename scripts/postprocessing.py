@@ -0,0 +1,113 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from metrics import macro_f1, macro_f1_from_counts
+
+
+class ClassMultipliers(object):
+    """Multiplier of probability of each class maximizing macro F1 of the class of the highest.
+
+    Multipliers are searched by coordinate ascent. When the multiplier of class k increases, each
+    row changes its prediction to k at one value (its breakpoint). So rows are sorted by their
+    breakpoints and the numbers of true positives and predictions of every class are accumulated
+    over them, which gives macro F1 of all distinct values of the multiplier in one pass.
+    """
+
+    def __init__(self, num_rounds: int = 5, tol: float = 1e-9):
+        self.num_rounds = num_rounds
+        self.tol = tol
+
+    def fit(
+            self,
+            proba: np.ndarray,
+            y: np.ndarray,
+            classes: Optional[np.ndarray] = None) -> 'ClassMultipliers':
+        """Search multipliers on out-of-fold predictions.
+
+        Parameters
+        ----------
+        proba : np.ndarray
+            Predicted probabilities of shape (n, n_classes), e.g. `FoldResult.oof`.
+            Rows having nan are ignored.
+        y : np.ndarray
+            Target of each row.
+        classes : np.ndarray, optional
+            Class labels associated with columns of `proba`, by default 0, 1, ...
+        """
+        proba = np.asarray(proba, dtype=np.float64)
+        is_valid = ~np.isnan(proba).any(axis=1)
+        proba = proba[is_valid]
+        num_classes = proba.shape[1]
+        self.classes_ = np.arange(num_classes) if classes is None else np.asarray(classes)
+        labels = np.searchsorted(self.classes_, np.asarray(y)[is_valid])
+        multipliers = np.ones(num_classes)
+        self.initial_score_ = float(macro_f1(labels, np.argmax(proba, axis=1), num_classes)[0])
+        score = self.initial_score_
+        for _ in range(self.num_rounds):
+            improved = False
+            for k in range(num_classes):
+                value, new_score = _line_search(proba, labels, multipliers, k)
+                if new_score > score + self.tol:
+                    multipliers[k], score, improved = value, new_score, True
+            if not improved:
+                break
+        self.multipliers_ = multipliers / multipliers.max()
+        self.score_ = float(macro_f1(
+            labels, np.argmax(proba * self.multipliers_, axis=1), num_classes)[0])
+        return self
+
+    def transform(self, proba: np.ndarray) -> np.ndarray:
+        """`proba` multiplied by the multiplier of each class."""
+        if not hasattr(self, 'multipliers_'):
+            raise AttributeError('Multipliers are determined after calling `fit`')
+        return np.asarray(proba) * self.multipliers_
+
+    def predict(self, proba: np.ndarray) -> np.ndarray:
+        """Class label of the highest multiplied probability of each row."""
+        return self.classes_[np.argmax(self.transform(proba), axis=1)]
+
+
+def _line_search(
+        proba: np.ndarray,
+        labels: np.ndarray,
+        multipliers: np.ndarray,
+        k: int) -> Tuple[float, float]:
+    """Best multiplier of class `k` and macro F1 with it, the others fixed."""
+    nrows, num_classes = proba.shape
+    others = proba * multipliers
+    others[:, k] = -np.inf
+    other_classes = np.argmax(others, axis=1)
+    best_others = others[np.arange(nrows), other_classes]
+    # Row is predicted as k iff the multiplier is greater than its breakpoint
+    with np.errstate(divide='ignore', invalid='ignore'):
+        breakpoints = np.where(proba[:, k] > 0, best_others / proba[:, k], np.inf)
+    order = np.argsort(breakpoints, kind='stable')
+    breakpoints = breakpoints[order]
+    from_classes, true_classes = other_classes[order], labels[order]
+
+    # Counts of each class when the first s rows are predicted as k, s = 0, 1, ..., nrows
+    rows = np.arange(nrows)
+    delta_pred = np.zeros((nrows, num_classes), dtype=np.int64)
+    delta_pred[rows, from_classes] -= 1
+    delta_pred[:, k] += 1
+    delta_tp = np.zeros((nrows, num_classes), dtype=np.int64)
+    delta_tp[rows, from_classes] -= true_classes == from_classes
+    delta_tp[:, k] += true_classes == k
+    num_pred = np.bincount(other_classes, minlength=num_classes)
+    tp = np.bincount(other_classes[labels == other_classes], minlength=num_classes)
+    num_pred = np.vstack([num_pred, num_pred + np.cumsum(delta_pred, axis=0)])
+    tp = np.vstack([tp, tp + np.cumsum(delta_tp, axis=0)])
+    scores = macro_f1_from_counts(tp, np.bincount(labels, minlength=num_classes), num_pred)
+
+    # Multiplier between lower and upper gives s rows predicted as k
+    lower, upper = np.append(0., breakpoints), np.append(breakpoints, np.inf)
+    scores[~(lower < upper)] = -np.inf
+    s = int(np.argmax(scores))
+    if np.isinf(upper[s]):
+        value = lower[s] * 2. if lower[s] > 0 else 1.
+    elif lower[s] == 0:
+        value = upper[s] / 2.
+    else:
+        value = np.sqrt(lower[s] * upper[s])
+    return float(value), float(scores[s])
@@ -0,0 +1,176 @@
+import os
+import os.path
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator
+
+from fold_runner import FoldResult, run_folds
+from metrics import macro_f1
+
+OOF_FILENAME = 'oof.npy'
+TEST_FILENAME = 'test.npy'
+OOF_ID_FILENAME = 'oof_id.npy'
+TEST_ID_FILENAME = 'test_id.npy'
+CLASSES_FILENAME = 'classes.npy'
+
+
+class Predictions(NamedTuple):
+    '''Predictions of many experiments aligned by `id`.
+
+    names: Experiment directory of each model.
+    oof: (n_models, n_train, n_classes) float32 out-of-fold predictions, nan for rows without them.
+    test: (n_models, n_test, n_classes) float32 predictions for test set.
+    classes: Class labels associated with the last axis.
+    '''
+    names: List[str]
+    oof: np.ndarray
+    test: np.ndarray
+    classes: np.ndarray
+
+
+class BlendResult(NamedTuple):
+    '''Output of `search_blend_weights`, `weights` of each model and macro F1 of the blend.'''
+    weights: np.ndarray
+    score: float
+
+
+def save_predictions(
+        exp_dir: str,
+        train_ids: Sequence[int],
+        oof: np.ndarray,
+        test_ids: Sequence[int],
+        test: np.ndarray,
+        classes: np.ndarray) -> None:
+    '''Save predictions of an experiment, e.g. `FoldResult.oof` and `test`, as float32 .npy.'''
+    os.makedirs(exp_dir, exist_ok=True)
+    arrays = {
+        OOF_FILENAME: np.asarray(oof, dtype=np.float32),
+        TEST_FILENAME: np.asarray(test, dtype=np.float32),
+        OOF_ID_FILENAME: np.asarray(train_ids),
+        TEST_ID_FILENAME: np.asarray(test_ids),
+        CLASSES_FILENAME: np.asarray(classes),
+    }
+    for filename, array in arrays.items():
+        np.save(os.path.join(exp_dir, filename), array)
+
+
+def load_predictions(
+        exp_dirs: Sequence[str],
+        train_ids: Sequence[int],
+        test_ids: Sequence[int],
+        classes: Optional[np.ndarray] = None) -> Predictions:
+    '''Load predictions saved by `save_predictions` into arrays aligned by `id`.
+
+    Parameters
+    ----------
+    exp_dirs : Sequence[str]
+        Experiment directories.
+    train_ids, test_ids : Sequence[int]
+        `id` of rows of output. Training rows missing in an experiment get nan.
+    classes : np.ndarray, optional
+        Class labels of output, by default sorted labels of all experiments.
+        Classes missing in an experiment get 0.
+
+    Raises
+    ------
+    KeyError
+        Some of `test_ids` are not predicted by an experiment.
+    '''
+    saved_classes = [np.load(os.path.join(d, CLASSES_FILENAME)) for d in exp_dirs]
+    if classes is None:
+        classes = np.unique(np.concatenate(saved_classes)) if saved_classes else np.empty(0)
+    train_index, test_index = pd.Index(np.asarray(train_ids)), pd.Index(np.asarray(test_ids))
+    oof = np.full((len(exp_dirs), len(train_index), len(classes)), np.nan, dtype=np.float32)
+    test = np.zeros((len(exp_dirs), len(test_index), len(classes)), dtype=np.float32)
+    for i, (exp_dir, exp_classes) in enumerate(zip(exp_dirs, saved_classes)):
+        columns = np.searchsorted(classes, exp_classes)
+        rows = pd.Index(np.load(os.path.join(exp_dir, OOF_ID_FILENAME))).get_indexer(train_index)
+        has_row = rows >= 0
+        oof[i][has_row] = 0.
+        saved_oof = np.load(os.path.join(exp_dir, OOF_FILENAME), mmap_mode='r')
+        oof[i][np.ix_(has_row, columns)] = saved_oof[rows[has_row]]
+        rows = pd.Index(np.load(os.path.join(exp_dir, TEST_ID_FILENAME))).get_indexer(test_index)
+        if (rows < 0).any():
+            raise KeyError(f'{exp_dir} does not have ids {test_index[rows < 0].tolist()[:5]}...')
+        test[i][:, columns] = np.load(os.path.join(exp_dir, TEST_FILENAME), mmap_mode='r')[rows]
+    return Predictions(names=list(exp_dirs), oof=oof, test=test, classes=np.asarray(classes))
+
+
+def blend(weights: np.ndarray, proba: np.ndarray) -> np.ndarray:
+    '''Weighted sum of predictions of models, (..., n_models) x (n_models, n, n_classes).'''
+    return np.einsum('...m,mnc->...nc', weights, proba)
+
+
+def search_blend_weights(
+        predictions: Predictions,
+        y: np.ndarray,
+        num_candidates: int = 1000,
+        batch_size: int = 32,
+        random_state: int = 1) -> BlendResult:
+    '''Random search of blend weights maximizing macro F1 of out-of-fold predictions.
+
+    Candidates are each model alone, uniform weights and weights drawn from the flat Dirichlet
+    distribution. Candidates of a batch are blended with one `einsum` and scored with one
+    confusion-matrix `bincount`. Rows without out-of-fold prediction of some model are ignored.
+
+    Parameters
+    ----------
+    predictions : Predictions
+        Output of `load_predictions`.
+    y : np.ndarray
+        Target of training rows.
+    num_candidates : int, optional
+        Number of random candidates, by default 1000
+    batch_size : int, optional
+        Number of candidates evaluated at once, by default 32
+    random_state : int, optional
+        Seed of weights, by default 1
+
+    Returns
+    -------
+    result : BlendResult
+    '''
+    num_models = predictions.oof.shape[0]
+    is_valid = ~np.isnan(predictions.oof).any(axis=(0, 2))
+    oof = predictions.oof[:, is_valid]
+    labels = np.searchsorted(predictions.classes, np.asarray(y)[is_valid])
+    rng = np.random.default_rng(random_state)
+    candidates = np.vstack([
+        np.eye(num_models),
+        np.full((1, num_models), 1. / num_models),
+        rng.dirichlet(np.ones(num_models), size=num_candidates),
+    ]).astype(np.float32)
+    scores = np.empty(candidates.shape[0])
+    for start in range(0, candidates.shape[0], batch_size):
+        batch = slice(start, start + batch_size)
+        y_preds = np.argmax(blend(candidates[batch], oof), axis=-1)
+        scores[batch] = macro_f1(labels, y_preds, predictions.classes.size)
+    best = int(np.argmax(scores))
+    return BlendResult(weights=candidates[best], score=float(scores[best]))
+
+
+def fit_meta_model(
+        estimator: BaseEstimator,
+        predictions: Predictions,
+        y: np.ndarray,
+        row_folds: np.ndarray,
+        n_jobs: Optional[int] = None) -> FoldResult:
+    '''Fit `estimator` on out-of-fold predictions of all models by `fold_runner.run_folds`.
+
+    Features are the predictions of all models side by side. `row_folds` should be the folds
+    the models were evaluated on, e.g. of `cross_validation.PlayerKFold`, so that the meta-model
+    is validated on the same groups. Rows without out-of-fold prediction of some model are not
+    fitted, and `oof` of the result is nan for them.
+    '''
+    num_models, num_rows, num_classes = predictions.oof.shape
+    X = predictions.oof.transpose(1, 0, 2).reshape(num_rows, num_models * num_classes)
+    X_test = predictions.test.transpose(1, 0, 2).reshape(-1, num_models * num_classes)
+    is_valid = ~np.isnan(X).any(axis=1)
+    result = run_folds(
+        estimator, X[is_valid], np.asarray(y)[is_valid], X_test, np.asarray(row_folds)[is_valid],
+        n_jobs=n_jobs)
+    oof = np.full((num_rows, result.oof.shape[1]), np.nan)
+    oof[is_valid] = result.oof
+    return result._replace(oof=oof)
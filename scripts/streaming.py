@@ -0,0 +1,208 @@
+import glob
+import os
+import os.path
+import shutil
+from typing import List, Optional
+
+import pandas as pd
+
+import pitching_pattern
+from inning import Inning
+from players import Hand, PlayerRegistry, PlayersID, PlayerState
+from teams import Teams
+
+STAGING_DIRNAME = 'staging'
+PLAYER_REGISTRY_FILENAME = 'player_registry.pickle'
+PLAYER_STATE_FILENAME = 'player_state.pickle'
+
+
+def preprocess_in_chunks(
+        pitch_csv: str,
+        game_info_csv: str,
+        out_dir: str,
+        chunksize: int = 100000) -> PlayerState:
+    '''Preprocess pitch-by-pitch data larger than memory.
+
+    1st, raw csv is read by `chunksize` rows, row-local transformations are applied
+    (see `transform_rows`) and rows are staged into partitions of each game day.
+    2nd, `playerID`s are assigned for all players, and hands of players are counted
+    over all game days after removing duplicate rows.
+    Finally, game days are processed in chronological order, carrying the last game of
+    each player, and written into "{out_dir}/{YYYYMMDD}.pickle".
+
+    Peak memory is bounded by one chunk or one game day plus states of players.
+
+    Parameters
+    ----------
+    pitch_csv : str
+        Filepath of pitch-by-pitch data, having the same columns as "train_data.csv".
+    game_info_csv : str
+        Filepath of game information, having the same columns as "game_info.csv".
+    out_dir : str
+        Directory where partitions are written.
+    chunksize : int, optional
+        Number of rows read at once, by default 100000
+
+    Returns
+    -------
+    state : PlayerState
+        State of players after processing all game days.
+    '''
+    game_info = pd.read_csv(game_info_csv, parse_dates=['startDayTime']) \
+        .drop(columns=['Unnamed: 0'], errors='ignore')
+    staging_dir = os.path.join(out_dir, STAGING_DIRNAME)
+    os.makedirs(staging_dir, exist_ok=True)
+
+    # Row-local transformation and partitioning by game day
+    pitchers, batters = [], []
+    for i, chunk in enumerate(pd.read_csv(pitch_csv, chunksize=chunksize)):
+        chunk = transform_rows(chunk, game_info)
+        pitchers.append(chunk[['pitcher', 'pitcherTeam']].drop_duplicates())
+        batters.append(chunk[['batter', 'batterTeam']].drop_duplicates())
+        for date, day in chunk.groupby(_game_day(chunk.startDayTime)):
+            os.makedirs(os.path.join(staging_dir, date), exist_ok=True)
+            day.to_pickle(os.path.join(staging_dir, date, f'{i:05d}.pickle'), protocol=-1)
+    registry = PlayerRegistry.from_player_ids(
+        PlayersID(
+            pitchers=pd.concat(pitchers).drop_duplicates(),
+            batters=pd.concat(batters).drop_duplicates()
+        ).assign())
+    registry.save(os.path.join(out_dir, PLAYER_REGISTRY_FILENAME))
+
+    # Remove duplication, assign IDs and count hands
+    state = PlayerState()
+    dates = sorted(
+        d for d in os.listdir(staging_dir) if os.path.isdir(os.path.join(staging_dir, d)))
+    for date in dates:
+        parts = sorted(glob.glob(os.path.join(staging_dir, date, '*.pickle')))
+        day = pd.concat([pd.read_pickle(p) for p in parts], ignore_index=True)
+        day = day.drop_duplicates(subset=[c for c in day.columns if c != 'id'])
+        day = assign_player_ids(day, registry)
+        state.add_hand_counts('pitcherID', Hand.count_hands(day.pitcherID, day.pitcherHand))
+        state.add_hand_counts('batterID', Hand.count_hands(day.batterID, day.batterHand))
+        shutil.rmtree(os.path.join(staging_dir, date))
+        day.to_pickle(os.path.join(staging_dir, f'{date}.pickle'), protocol=-1)
+
+    # Features depending on all game days so far
+    for date in dates:
+        staged = os.path.join(staging_dir, f'{date}.pickle')
+        day = transform_game_day(pd.read_pickle(staged), state)
+        day.to_pickle(os.path.join(out_dir, f'{date}.pickle'), protocol=-1)
+        os.remove(staged)
+    os.rmdir(staging_dir)
+    state.save(os.path.join(out_dir, PLAYER_STATE_FILENAME))
+    return state
+
+
+def update_game_days(pitches: pd.DataFrame, game_info: pd.DataFrame, out_dir: str) -> List[str]:
+    '''Process new game days incrementally on top of the output of `preprocess_in_chunks`.
+
+    Only the rows of new game days are processed, using the state of players saved in
+    `out_dir` (the last game, number of games and hand counts of each player), and the state
+    is updated. New players get new IDs while existing IDs are kept.
+    Rows already written are not updated even if hands of their players change.
+
+    Parameters
+    ----------
+    pitches : pd.DataFrame
+        Pitch-by-pitch data of new game days, having the same columns as "train_data.csv".
+    game_info : pd.DataFrame
+        Game information of new game days, having the same columns as "game_info.csv".
+    out_dir : str
+        Directory given to `preprocess_in_chunks`.
+
+    Returns
+    -------
+    dates : List[str]
+        Game days written, "YYYYMMDD".
+
+    Raises
+    ------
+    ValueError
+        Some of the game days are not later than the last game day already processed.
+    '''
+    state = PlayerState.load(os.path.join(out_dir, PLAYER_STATE_FILENAME))
+    registry = PlayerRegistry.load(os.path.join(out_dir, PLAYER_REGISTRY_FILENAME))
+    game_info = game_info.drop(columns=['Unnamed: 0'], errors='ignore') \
+        .assign(startDayTime=lambda df: pd.to_datetime(df.startDayTime))
+
+    df = transform_rows(pitches.copy(), game_info)
+    df = df.drop_duplicates(subset=[c for c in df.columns if c != 'id'])
+    dates = sorted(_game_day(df.startDayTime).unique())
+    processed_dates = _partition_dates(out_dir)
+    if processed_dates and dates and dates[0] <= processed_dates[-1]:
+        raise ValueError(
+            f'Game days must be later than {processed_dates[-1]} but {dates[0]} given')
+
+    registry.register(
+        pd.concat([df.pitcher, df.batter]), pd.concat([df.pitcherTeam, df.batterTeam]))
+    df = assign_player_ids(df, registry)
+    state.add_hand_counts('pitcherID', Hand.count_hands(df.pitcherID, df.pitcherHand))
+    state.add_hand_counts('batterID', Hand.count_hands(df.batterID, df.batterHand))
+    for date, day in df.groupby(_game_day(df.startDayTime)):
+        day = transform_game_day(day.reset_index(drop=True), state)
+        day.to_pickle(os.path.join(out_dir, f'{date}.pickle'), protocol=-1)
+
+    registry.save(os.path.join(out_dir, PLAYER_REGISTRY_FILENAME))
+    state.save(os.path.join(out_dir, PLAYER_STATE_FILENAME))
+    return dates
+
+
+def transform_rows(df: pd.DataFrame, game_info: pd.DataFrame) -> pd.DataFrame:
+    '''Transformations which need only each row and game information.
+
+    Bool columns are conveted into integer flag, `inningNo`/`isBottom` are extracted from
+    `inning`, game information is merged, `batterTeam`/`pitcherTeam` are extracted
+    and `ballXY` is added.
+    '''
+    base_columns = [c for c in ['b1', 'b2', 'b3'] if c in df.columns]
+    df[base_columns] = df[base_columns] * 1
+    df = pd.concat([df, Inning.extract_info_column(df.inning)], axis=1)
+    nrows = df.shape[0]
+    df = pd.merge(df, game_info, on='gameID', how='inner')
+    assert(df.shape[0] == nrows)
+    df = pd.concat([df, Teams.extract_teams(df)], axis=1)
+    if 'ballX' in df.columns and 'ballY' in df.columns:
+        df['ballXY'] = pitching_pattern.ballXY(df)
+    return df
+
+
+def assign_player_ids(df: pd.DataFrame, registry: PlayerRegistry) -> pd.DataFrame:
+    '''Add `pitcherID` and `batterID` registered in `registry`.'''
+    df['pitcherID'] = registry.map(df.pitcher, df.pitcherTeam).values
+    df['batterID'] = registry.map(df.batter, df.batterTeam).values
+    return df
+
+
+def transform_game_day(df: pd.DataFrame, state: PlayerState) -> pd.DataFrame:
+    '''Add hands of players and participation of game day `df` continued from `state`.'''
+    df['isPitcherHandLeft'] = state.is_pitcher_hand_left(df.pitcherID)
+    df['isBatterHandLeft'] = state.is_batter_hand_left(df.batterID, df.isPitcherHandLeft)
+    nrows = df.shape[0]
+    for role, calc_pitcher in (('pitcher', True), ('batter', False)):
+        participation = state.hours_elapsed_from_last(df, calc_pitcher=calc_pitcher) \
+            .rename(columns={
+                'hoursElapsed': f'{role}HoursElapsed',
+                'numGamesParticipated': f'{role}NumGamesParticipated'})
+        df = pd.merge(df, participation, on=[f'{role}ID', 'gameID'], how='left')
+    assert(df.shape[0] == nrows)
+    return df
+
+
+def read_partitions(out_dir: str, dates: Optional[List[str]] = None) -> pd.DataFrame:
+    '''Read game days written by `preprocess_in_chunks`, all of them if `dates` is not given.'''
+    if dates is None:
+        dates = _partition_dates(out_dir)
+    return pd.concat(
+        [pd.read_pickle(os.path.join(out_dir, f'{date}.pickle')) for date in dates],
+        ignore_index=True)
+
+
+def _partition_dates(out_dir: str) -> List[str]:
+    return sorted(
+        os.path.splitext(os.path.basename(p))[0]
+        for p in glob.glob(os.path.join(out_dir, '[0-9]' * 8 + '.pickle')))
+
+
+def _game_day(start_day_time: pd.Series) -> pd.Series:
+    return start_day_time.dt.strftime('%Y%m%d')
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -20,3 +21,32 @@ class Teams(object):
             return s.bgBottom
         else:
             raise ValueError(f'`isBottom` must be one of [0, 1] but {s.isBottom} given')
+
+    @staticmethod
+    def extract_teams(df: pd.DataFrame) -> pd.DataFrame:
+        """`extract_batter_team` and `extract_pitcher_team` for all rows at once.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Having `isBottom`, `bgTop` and `bgBottom`.
+
+        Returns
+        -------
+        teams : pd.DataFrame
+            Having 2 columns, `batterTeam` and `pitcherTeam`, with the same index as `df`.
+        """
+        is_bottom = df.isBottom.values
+        invalid = (is_bottom != 0) & (is_bottom != 1)
+        if invalid.any():
+            raise ValueError(
+                f'`isBottom` must be one of [0, 1] but {is_bottom[invalid][0]} given')
+        is_bottom = is_bottom == 1
+        top, bottom = df.bgTop.values, df.bgBottom.values
+        return pd.DataFrame(
+            {
+                'batterTeam': np.where(is_bottom, bottom, top),
+                'pitcherTeam': np.where(is_bottom, top, bottom),
+            },
+            index=df.index
+        )
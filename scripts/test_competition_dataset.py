@@ -0,0 +1,196 @@
+import json
+import os
+import os.path
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import competition_dataset
+
+
+def write_dataset(data_dir: str) -> None:
+    '''Write tiny competition dataset having the same layout as "read_only" directory.'''
+    train = pd.DataFrame({
+        'id': [0, 1, 2, 3],
+        'gameID': [1, 1, 1, 2],
+        'inning': ['1回表', '1回表', '1回表', '1回裏'],
+        'B': [0, 1, 1, 0],
+        'S': [0, 0, 0, 1],
+        'O': [0, 0, 0, 2],
+        'b1': [False, False, False, True],
+        'b2': [False, False, False, False],
+        'b3': [True, False, False, False],
+        'pitcher': ['A', 'A', 'A', 'B'],
+        'batter': ['C', 'D', 'D', 'E'],
+        'pitchType': ['ストレート', 'カーブ', 'カーブ', 'フォーク'],
+        'y': [0, 1, 1, 2],
+    })
+    test = pd.DataFrame({
+        'id': [0, 1],
+        'gameID': [2, 3],
+        'inning': ['2回表', '9回裏'],
+        'B': [1, 3],
+        'S': [2, 2],
+        'O': [1, 0],
+        'b1': [False, True],
+        'b2': [True, True],
+        'b3': [False, True],
+        'pitcher': [None, 'B'],
+        'batter': ['C', None],
+        'pitchType': ['スライダー', 'ストレート'],
+    })
+    game_info = pd.DataFrame({
+        'gameID': [1, 2, 3],
+        'startDayTime': ['2020-06-19 18:00:00', '2020-06-20 14:00:00', '2020-06-21 18:00:00'],
+        'bgTop': [1, 2, 3],
+        'bgBottom': [4, 5, 6],
+    })
+    improvement = pd.DataFrame({
+        'id': [0, 1],
+        'pitcher': ['A', 'B'],
+        'batter': ['C', 'E'],
+    })
+    train.to_csv(os.path.join(data_dir, 'train_data.csv'), index=False)
+    test.to_csv(os.path.join(data_dir, 'test_data.csv'), index=False)
+    game_info.to_csv(os.path.join(data_dir, 'game_info.csv'))
+    improvement.to_csv(os.path.join(data_dir, 'test_data_improvement.csv'), index=False)
+
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tempdir.name
+        write_dataset(self.data_dir)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load(self):
+        train, test = competition_dataset.load(data_dir=self.data_dir)
+        self.assertEqual(train.shape[0], 3)  # 1 duplicated row is dropped
+        self.assertEqual(test.shape[0], 2)
+        self.assertEqual(train.b1.tolist(), [0, 0, 1])
+        self.assertEqual(test.pitcher.tolist(), ['A', 'B'])
+        self.assertEqual(test.batter.tolist(), ['C', 'E'])
+        self.assertNotIn('Unnamed: 0', train.columns)
+        self.assertEqual(test.bgTop.tolist(), [2, 3])
+
+    def test_cache(self):
+        expected_train, expected_test = competition_dataset.load(data_dir=self.data_dir)
+        # Cold
+        train, test = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        cache_dir = os.path.join(self.data_dir, competition_dataset.CACHE_DIRNAME)
+        self.assertTrue(os.path.isfile(os.path.join(cache_dir, competition_dataset.CACHE_MANIFEST)))
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train))
+        self.assertIsNone(pd.testing.assert_frame_equal(test, expected_test))
+        # Warm
+        train, test = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train))
+        self.assertIsNone(pd.testing.assert_frame_equal(test, expected_test))
+
+    def test_cache_is_rebuilt_when_source_changes(self):
+        competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        filepath = os.path.join(self.data_dir, 'test_data_improvement.csv')
+        pd.DataFrame({'id': [0, 1], 'pitcher': ['X', 'Y'], 'batter': ['Z', 'W']}) \
+            .to_csv(filepath, index=False)
+        _, test = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        self.assertEqual(test.pitcher.tolist(), ['X', 'Y'])
+        self.assertEqual(test.batter.tolist(), ['Z', 'W'])
+
+    def test_cache_is_rebuilt_when_loader_changes(self):
+        expected_train, _ = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        cache_dir = os.path.join(self.data_dir, competition_dataset.CACHE_DIRNAME)
+        # Cache made by another version of the loader
+        expected_train.head(1).to_pickle(os.path.join(cache_dir, 'train.pickle'))
+        train, _ = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        self.assertEqual(train.shape[0], 1)
+        with mock.patch.object(competition_dataset, '_loader_fingerprint', return_value='new'):
+            train, _ = competition_dataset.load(use_cache=True, data_dir=self.data_dir)
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train))
+        with open(os.path.join(cache_dir, competition_dataset.CACHE_MANIFEST)) as f:
+            self.assertEqual(json.load(f)[competition_dataset.LOADER_KEY], 'new')
+
+    def test_compact(self):
+        expected_train, expected_test = competition_dataset.load(data_dir=self.data_dir)
+        train, test = competition_dataset.load(data_dir=self.data_dir, compact=True)
+        for df in (train, test):
+            self.assertEqual(df.B.dtype, np.int8)
+            self.assertEqual(df.b1.dtype, np.int8)
+            self.assertEqual(df.pitchType.dtype, 'category')
+            self.assertEqual(df.inning.dtype, 'category')
+        self.assertEqual(train.y.dtype, np.int8)
+        # Fixed cost of categories is negligible for the size of real dataset
+        self.assertLess(pd.concat([train] * 200).memory_usage(deep=True).sum(),
+                        pd.concat([expected_train] * 200).memory_usage(deep=True).sum())
+        # Values are unchanged
+        self.assertIsNone(pd.testing.assert_frame_equal(
+            train, expected_train, check_dtype=False, check_categorical=False))
+        self.assertIsNone(pd.testing.assert_frame_equal(
+            test, expected_test, check_dtype=False, check_categorical=False))
+
+    def test_compact_verbose(self):
+        with mock.patch('builtins.print') as print_:
+            competition_dataset.load(data_dir=self.data_dir, compact=True)
+            self.assertEqual(print_.call_count, 0)
+            competition_dataset.load(data_dir=self.data_dir, compact=True, verbose=True)
+            self.assertEqual(print_.call_count, 2)
+        self.assertTrue(print_.call_args_list[0][0][0].startswith('Memory usage of train'))
+
+    def test_compact_shares_categories(self):
+        train, test = competition_dataset.load(data_dir=self.data_dir, compact=True)
+        for c in ('inning', 'pitcher', 'batter', 'pitchType'):
+            self.assertEqual(train[c].dtype, test[c].dtype)
+            self.assertEqual(
+                train[c].cat.categories.tolist(),
+                sorted(set(train[c].dropna()) | set(test[c].dropna())))
+        # Codes agree and concatenation keeps category dtype
+        self.assertEqual(pd.concat([train, test]).pitchType.dtype, 'category')
+        codes = dict(zip(train.pitchType, train.pitchType.cat.codes))
+        self.assertEqual(test.pitchType.iloc[1], 'ストレート')  # Also in training set
+        self.assertEqual(test.pitchType.cat.codes.iloc[1], codes['ストレート'])
+
+    def test_compact_dtypes(self):
+        input_ = pd.DataFrame({
+            'B': [0, 1, np.nan],  # Having missing value
+            'S': [0, 1, 2],
+            'speed': [140.5, 150.25, np.nan],
+        })
+        output = competition_dataset.compact_dtypes(input_, verbose=False)
+        self.assertEqual(output.B.dtype, np.float32)
+        self.assertEqual(output.S.dtype, np.int8)
+        self.assertEqual(output.speed.dtype, np.float32)
+
+    def test_projection(self):
+        expected_train, expected_test = competition_dataset.load(data_dir=self.data_dir)
+        columns = ['id', 'B', 'b1', 'batter', 'bgTop', 'y']
+        train, test = competition_dataset.load(data_dir=self.data_dir, columns=columns)
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train[columns]))
+        self.assertIsNone(pd.testing.assert_frame_equal(test, expected_test[columns[:-1]]))
+        train, = competition_dataset.load(data_dir=self.data_dir, columns=columns, splits=['train'])
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train[columns]))
+        # Nothing is written into data directory without `use_cache`
+        self.assertFalse(os.path.exists(
+            os.path.join(self.data_dir, competition_dataset.CACHE_DIRNAME)))
+        # Game information is not needed
+        test, = competition_dataset.load(
+            data_dir=self.data_dir, columns=['pitcher'], splits=['test'])
+        self.assertIsNone(pd.testing.assert_frame_equal(test, expected_test[['pitcher']]))
+        # Projection of cached dataset
+        train, test = competition_dataset.load(
+            use_cache=True, data_dir=self.data_dir, columns=columns)
+        self.assertIsNone(pd.testing.assert_frame_equal(train, expected_train[columns]))
+        self.assertIsNone(pd.testing.assert_frame_equal(test, expected_test[columns[:-1]]))
+
+    def test_projection_invalid_arguments(self):
+        with self.assertRaises(KeyError):
+            competition_dataset.load(data_dir=self.data_dir, columns=['id', 'unknown'])
+        with self.assertRaises(ValueError):
+            competition_dataset.load(data_dir=self.data_dir, splits=['valid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
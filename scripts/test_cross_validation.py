@@ -0,0 +1,92 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cross_validation
+import utils
+from cross_validation import PlayerKFold
+
+
+class TestPlayerKFold(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        nrows = 1000
+        self.groups = pd.Series(rng.integers(0, 50, nrows))
+        self.y = pd.Series(rng.choice(8, nrows, p=[.3, .25, .2, .1, .08, .04, .01, .02]))
+
+    def test_split(self):
+        kfold = PlayerKFold(n_splits=5, random_state=1)
+        folds = list(kfold.split(groups=self.groups, y=self.y))
+        valid_ids = kfold.get_valid_ids()
+        self.assertEqual(len(folds), 5)
+        all_valid_idx = []
+        for (train_idx, valid_idx), ids in zip(folds, valid_ids.values()):
+            # Sorted integer arrays
+            self.assertTrue(np.issubdtype(train_idx.dtype, np.integer))
+            self.assertTrue(np.all(np.diff(train_idx) > 0))
+            self.assertTrue(np.all(np.diff(valid_idx) > 0))
+            # Same as the ids of validation fold
+            self.assertEqual(valid_idx.tolist(),
+                             [i for i, id_ in enumerate(self.groups.values) if id_ in ids])
+            self.assertEqual(np.union1d(train_idx, valid_idx).tolist(),
+                             list(range(self.groups.shape[0])))
+            self.assertEqual(np.intersect1d(train_idx, valid_idx).size, 0)
+            all_valid_idx.append(valid_idx)
+        # Each row appears in validation fold exactly once
+        self.assertEqual(np.sort(np.concatenate(all_valid_idx)).tolist(),
+                         list(range(self.groups.shape[0])))
+
+    def test_same_folds_for_same_random_state(self):
+        folds1 = list(PlayerKFold(random_state=1).split(groups=self.groups, y=self.y))
+        folds2 = list(PlayerKFold(random_state=1).split(groups=self.groups, y=self.y))
+        for (train_idx1, valid_idx1), (train_idx2, valid_idx2) in zip(folds1, folds2):
+            self.assertTrue(np.array_equal(train_idx1, train_idx2))
+            self.assertTrue(np.array_equal(valid_idx1, valid_idx2))
+
+
+class TestPersistedFolds(unittest.TestCase):
+
+    def test_row_folds_from_ids(self):
+        groups = pd.Series([10, 20, 30, 10, 40, 50])
+        fold = {'0': [10, 50], '1': [20], '2': [30]}  # Same format as "group_kfold_*.json"
+        expected = np.array([0, 1, 2, 0, utils.NOT_ASSIGNED, 0], dtype=np.int8)
+        output = cross_validation.row_folds_from_ids(groups, fold)
+        self.assertTrue(np.array_equal(output, expected))
+        self.assertEqual(output.dtype, np.int8)
+        folds = list(cross_validation.split_by_folds(output))
+        self.assertEqual(len(folds), 3)
+        self.assertEqual(folds[0][0].tolist(), [1, 2, 4])
+        self.assertEqual(folds[0][1].tolist(), [0, 3, 5])
+
+    def test_save_and_load(self):
+        rng = np.random.default_rng(1)
+        groups = pd.Series(rng.integers(0, 50, 500))
+        y = pd.Series(rng.integers(0, 8, 500))
+        kfold = PlayerKFold(n_splits=5, random_state=1)
+        expected = list(kfold.split(groups=groups, y=y))
+        fingerprint = utils.dataset_fingerprint(groups, y)
+        with tempfile.TemporaryDirectory() as fold_dir:
+            filepath = cross_validation.save_folds(
+                fold_dir, 'player_kfold', kfold.get_row_folds(), fingerprint)
+            self.assertTrue(os.path.isfile(filepath))
+            row_folds = cross_validation.load_folds(fold_dir, 'player_kfold', fingerprint)
+            self.assertIsInstance(row_folds, np.memmap)
+            for (train_idx, valid_idx), (expected_train_idx, expected_valid_idx) in zip(
+                    cross_validation.split_by_folds(row_folds), expected):
+                self.assertTrue(np.array_equal(train_idx, expected_train_idx))
+                self.assertTrue(np.array_equal(valid_idx, expected_valid_idx))
+            del row_folds
+            # Another dataset
+            y.iloc[0] = (y.iloc[0] + 1) % 8
+            fingerprint_changed = utils.dataset_fingerprint(groups, y)
+            self.assertNotEqual(fingerprint, fingerprint_changed)
+            with self.assertRaises(FileNotFoundError):
+                cross_validation.load_folds(fold_dir, 'player_kfold', fingerprint_changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import importlib
+import os.path
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cross_validation
+import feature_store
+import pitching_pattern
+from feature_store import FeatureStore, feature_group
+from players import GameParticipation, Hand
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.calls = []
+        self.groups = {}
+
+        @feature_group('double', inputs=['x'], registry=self.groups)
+        def double(df):
+            self.calls.append('double')
+            return pd.DataFrame({'x2': df.x * 2})
+
+        @feature_group('quadruple', inputs=[], depends_on=['double'], registry=self.groups)
+        def quadruple(df):
+            self.calls.append('quadruple')
+            return pd.DataFrame({'x4': df.x2 * 2})
+
+        self.data = pd.DataFrame({'x': [1, 2, 3], 'y': [0, 0, 0]}, index=[10, 11, 12])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load(self):
+        store = FeatureStore(self.tempdir.name, groups=self.groups)
+        output = store.load(['double', 'quadruple'], self.data)
+        self.assertEqual(output.columns.tolist(), ['x2', 'x4'])
+        self.assertEqual(output.index.tolist(), [10, 11, 12])
+        self.assertEqual(output.x4.tolist(), [4, 8, 12])
+        self.assertEqual(self.calls, ['double', 'quadruple'])
+        # Cached
+        store.load(['double', 'quadruple'], self.data)
+        self.assertEqual(self.calls, ['double', 'quadruple'])
+        # Only requested groups are loaded
+        self.assertEqual(store.load(['double'], self.data).columns.tolist(), ['x2'])
+
+    def test_invalidation(self):
+        store = FeatureStore(self.tempdir.name, groups=self.groups)
+        store.load(['quadruple'], self.data)
+        # Columns which are not inputs do not matter
+        store.load(['quadruple'], self.data.assign(y=1))
+        self.assertEqual(self.calls, ['double', 'quadruple'])
+        # Change of inputs invalidates dependents too
+        output = store.load(['quadruple'], self.data.assign(x=[0, 0, 1]))
+        self.assertEqual(output.x4.tolist(), [0, 0, 4])
+        self.assertEqual(self.calls, ['double', 'quadruple'] * 2)
+        # Change of code
+        key = store.key('double', self.data)
+
+        @feature_group('double', inputs=['x'], registry=self.groups)
+        def double(df):
+            return pd.DataFrame({'x2': df.x + df.x})
+
+        self.assertNotEqual(store.key('double', self.data), key)
+        with self.assertRaises(KeyError):
+            store.load(['unknown'], self.data)
+
+    def test_invalidation_by_helper(self):
+        helper_dir = os.path.join(self.tempdir.name, 'helpers')
+        os.makedirs(helper_dir)
+        filepath = os.path.join(helper_dir, 'feature_store_helper.py')
+        with open(filepath, 'w') as f:
+            f.write('def scale(x):\n    return x * 2\n')
+        sys.path.insert(0, helper_dir)
+        self.addCleanup(sys.path.remove, helper_dir)
+        self.addCleanup(sys.modules.pop, 'feature_store_helper', None)
+        helper = importlib.import_module('feature_store_helper')
+
+        @feature_group('scaled', inputs=['x'], registry=self.groups)
+        def scaled(df):
+            return pd.DataFrame({'scaled': helper.scale(df.x)})
+
+        store = FeatureStore(os.path.join(self.tempdir.name, 'store'), groups=self.groups)
+        key = store.key('scaled', self.data)
+        self.assertEqual(store.load(['scaled'], self.data).scaled.tolist(), [2, 4, 6])
+        # Change of the helper module
+        with open(filepath, 'w') as f:
+            f.write('def scale(x):\n    return x * 3\n')
+        importlib.reload(helper)
+        self.assertNotEqual(store.key('scaled', self.data), key)
+        self.assertEqual(store.load(['scaled'], self.data).scaled.tolist(), [3, 6, 9])
+        # Change of version
+        key = store.key('scaled', self.data)
+        feature_group('scaled', inputs=['x'], registry=self.groups, version=1)(scaled)
+        self.assertNotEqual(store.key('scaled', self.data), key)
+
+    def test_invalidation_by_helper_of_same_module(self):
+        helper_dir = os.path.join(self.tempdir.name, 'helpers')
+        os.makedirs(helper_dir)
+        filepath = os.path.join(helper_dir, 'feature_store_helper2.py')
+        with open(filepath, 'w') as f:
+            f.write('def scale(x):\n    return x * 2\n')
+        with open(os.path.join(helper_dir, 'feature_store_groups.py'), 'w') as f:
+            f.write(
+                'import feature_store_helper2\n\n\n'
+                'def scaled(df):\n    return _scale(df.x)\n\n\n'
+                'def _scale(x):\n    return feature_store_helper2.scale(x)\n')
+        sys.path.insert(0, helper_dir)
+        self.addCleanup(sys.path.remove, helper_dir)
+        self.addCleanup(sys.modules.pop, 'feature_store_helper2', None)
+        self.addCleanup(sys.modules.pop, 'feature_store_groups', None)
+        groups = importlib.import_module('feature_store_groups')
+        fingerprint = feature_store.code_fingerprint(groups.scaled)
+        # Change of the module used only through a helper function of the group's module
+        with open(filepath, 'w') as f:
+            f.write('def scale(x):\n    return x * 3\n')
+        self.assertNotEqual(feature_store.code_fingerprint(groups.scaled), fingerprint)
+
+    def test_builtin_groups(self):
+        data = pd.DataFrame({
+            'gameID': [1, 1, 1, 2],
+            'startDayTime': ['2020-06-19 18:00:00'] * 3 + ['2020-06-20 14:00:00'],
+            'inning': ['1回表'] * 4,
+            'O': [0, 0, 0, 0],
+            'pitcherID': [0, 0, 0, 0],
+            'pitcherHand': ['L', 'L', 'L', 'L'],
+            'batterID': [1, 1, 2, 1],
+            'batterHand': ['R', 'R', 'L', 'R'],
+            'totalPitchingCount': [1, 2, 1, 1],
+            'ballX': [1, 1, 9, 2],
+            'ballY': ['a', 'a', 'k', 'b'],
+        })
+        store = FeatureStore(self.tempdir.name)
+        output = store.load(['hands', 'participation', 'zone_counts'], data)
+        self.assertEqual(
+            output.isPitcherHandLeft.tolist(), Hand.is_pitcher_hand_left(data).tolist())
+        self.assertEqual(output.isBatterHandLeft.tolist(), [0, 0, 1, 0])
+        pitchers, _ = GameParticipation(data).hours_elapsed_from_last_all()
+        self.assertEqual(output.pitcherNumGamesParticipated.tolist(), [1, 1, 1, 2])
+        self.assertEqual(output.pitcherHoursElapsed.iloc[3], pitchers.hoursElapsed.iloc[1])
+        self.assertEqual(output['1a'].tolist(), [2, 2, 0, 0])
+        self.assertEqual(output['9k'].tolist(), [0, 0, 1, 0])
+        self.assertEqual(output['2b'].tolist(), [0, 0, 0, 1])
+        self.assertTrue(np.isnan(output.batterHoursElapsed.iloc[0]))
+        self.assertIn('zone_counts', feature_store.FEATURE_GROUPS)
+
+    def test_player_zone_counts(self):
+        data = pd.DataFrame({
+            'pitcherID': [0, 0, 0, 1, 0],
+            'batterID': [5, 6, 5, 5, 6],
+            'ballX': [1, 1, 2, 1, 1],
+            'ballY': ['a', 'a', 'b', 'a', 'a'],
+        })
+        fold_dir = self.tempdir.name
+        cross_validation.save_folds(fold_dir, 'batterID', np.array([0, 1, 0, 0]), 'abc')
+        data = feature_store.assign_row_folds(data, fold_dir, 'batterID', 'abc')
+        self.assertEqual(data[feature_store.ROW_FOLD_COLUMN].tolist(), [0, 1, 0, 0, -1])
+        output = FeatureStore(self.tempdir.name).load(
+            ['pitcher_zone_counts', 'batter_zone_counts'], data)
+        self.assertEqual(output.shape, (5, 2 * len(pitching_pattern.ZONES)))
+        # Pitches in the same validation fold are left out, test rows count all pitches
+        self.assertEqual(output.pitcherZone_1a.tolist(), [2, 2, 2, 0, 3])
+        self.assertEqual(output.batterZone_1a.tolist(), [0, 1, 0, 0, 2])
+        self.assertEqual(output.pitcherZone_2b.tolist(), [0, 1, 0, 0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from features import (FrequencyEncoder, OneHotEncoder, TargetEncoder, load_feature_matrix,
+                      save_feature_matrix)
+
+
+class TestOneHotEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.train = pd.DataFrame({
+            'batterID': [3, 1, 2, 3, 1],
+            'Match': ['b', 'a', 'c', 'a', 'a'],
+            'b1': [0, 1, 0, 0, 1],
+        })
+        self.test = pd.DataFrame({
+            'batterID': [2, 4, 1],  # 4 does not appear in train
+            'Match': ['c', 'a', 'b'],
+            'b1': [1, 1, 0],
+        })
+        self.columns = ['batterID', 'Match', 'b1']
+
+    def test_same_as_get_dummies(self):
+        for drop_first in (True, False):
+            encoder = OneHotEncoder(columns=self.columns, drop_first=drop_first).fit(self.train)
+            expected = pd.get_dummies(self.train, columns=self.columns, drop_first=drop_first)
+            output = encoder.transform(self.train)
+            self.assertTrue(sparse.isspmatrix_csr(output))
+            self.assertEqual(encoder.get_feature_names(), expected.columns.tolist())
+            self.assertTrue(np.array_equal(output.toarray(), expected.values.astype(np.float32)))
+
+    def test_unknown_category(self):
+        encoder = OneHotEncoder(columns=self.columns, drop_first=False).fit(self.train)
+        output = encoder.transform(self.test, dense=True)
+        self.assertIsInstance(output, np.ndarray)
+        self.assertEqual(output.shape, (3, len(encoder.get_feature_names())))
+        expected = pd.DataFrame(output, columns=encoder.get_feature_names())
+        self.assertEqual(expected.loc[0, 'batterID_2'], 1)
+        self.assertEqual(expected.loc[1, ['batterID_1', 'batterID_2', 'batterID_3']].sum(), 0)
+        self.assertEqual(output.sum(axis=1).tolist(), [3, 2, 3])
+
+    def test_not_fitted(self):
+        with self.assertRaises(AttributeError):
+            OneHotEncoder(columns=self.columns).transform(self.train)
+
+
+class TestOutOfFoldEncoders(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.df = pd.DataFrame({
+            'batterID': rng.integers(0, 6, size=40),
+            'Match': rng.choice(['a', 'b', 'c', None], size=40),
+        })
+        self.y = rng.integers(0, 3, size=40)
+        self.row_folds = (np.arange(40) % 3).astype(np.int8)
+        self.row_folds[:4] = -1
+        self.columns = ['batterID', 'Match']
+
+    def test_target_encoder(self):
+        encoder = TargetEncoder(columns=self.columns, smoothing=2.)
+        output = encoder.fit(self.df, self.y).transform(self.df.iloc[:3])
+        self.assertEqual(output.shape, (3, 6))
+        self.assertEqual(output.dtype, np.float32)
+        self.assertEqual(len(encoder.get_feature_names()), 6)
+        # Smoothed rate of each class
+        prior = np.bincount(self.y) / self.y.size
+        is_category = self.df.batterID == self.df.batterID.iloc[0]
+        counts = np.bincount(self.y[is_category], minlength=3)
+        expected = (counts + 2. * prior) / (counts.sum() + 2.)
+        self.assertTrue(np.allclose(output[0, :3], expected))
+        self.assertTrue(np.allclose(output.reshape(3, 2, 3).sum(axis=2), 1.))
+        # Unseen category and missing value
+        unseen = encoder.transform(pd.DataFrame({'batterID': [100], 'Match': [None]}))
+        self.assertTrue(np.allclose(unseen, np.tile(prior, 2)))
+
+    def test_target_encoder_out_of_fold(self):
+        output = TargetEncoder(columns=self.columns, smoothing=2.) \
+            .fit_transform_oof(self.df, self.y, self.row_folds)
+        # Same as fitting rows out of the fold
+        for fold in (-1, 0, 1, 2):
+            is_valid = self.row_folds == fold
+            is_train = ~is_valid if fold >= 0 else self.row_folds >= 0
+            expected = TargetEncoder(columns=self.columns, smoothing=2.) \
+                .fit(self.df[is_train], self.y[is_train]) \
+                .transform(self.df[is_valid])
+            self.assertTrue(np.allclose(output[is_valid], expected))
+
+    def test_frequency_encoder(self):
+        encoder = FrequencyEncoder(columns=self.columns)
+        output = encoder.fit(self.df).transform(self.df)
+        expected = self.df.batterID.map(self.df.batterID.value_counts()) / 40
+        self.assertTrue(np.allclose(output[:, 0], expected))
+        self.assertTrue((output[self.df.Match.isna().values, 1] == 0).all())
+        self.assertEqual(encoder.get_feature_names(), ['batterID_frequency', 'Match_frequency'])
+        output = FrequencyEncoder(columns=self.columns, normalize=False).fit_transform_oof(
+            self.df, self.row_folds)
+        for fold in (-1, 0, 1, 2):
+            is_valid = self.row_folds == fold
+            is_train = ~is_valid if fold >= 0 else self.row_folds >= 0
+            expected = FrequencyEncoder(columns=self.columns, normalize=False) \
+                .fit(self.df[is_train]) \
+                .transform(self.df[is_valid])
+            self.assertTrue(np.allclose(output[is_valid], expected))
+
+
+class TestFeatureMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.tempdir.name, 'train_vector.npy')
+        self.df = pd.DataFrame({
+            '1a': [0, 1, 2, 3],
+            'ど真ん中': [1.5, np.nan, 0., 2.],
+            'other': ['x', 'y', 'z', 'w'],
+        })
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_save_and_load(self):
+        columns = ['ど真ん中', '1a']
+        saved = save_feature_matrix(self.filepath, self.df, columns=columns)
+        loaded = load_feature_matrix(self.filepath)
+        for matrix in (saved, loaded):
+            self.assertIsInstance(matrix.values, np.memmap)
+            self.assertEqual(matrix.values.dtype, np.float32)
+            self.assertTrue(matrix.values.flags.c_contiguous)
+            self.assertEqual(matrix.columns, columns)
+            self.assertTrue(np.array_equal(
+                matrix.values, self.df[columns].values.astype(np.float32), equal_nan=True))
+
+    def test_take(self):
+        matrix = save_feature_matrix(self.filepath, self.df, columns=['ど真ん中', '1a'])
+        view = matrix.take(slice(1, 3))
+        self.assertTrue(np.shares_memory(view, matrix.values))
+        self.assertEqual(matrix.take(np.array([0, 3]), columns=['1a']).tolist(), [[0.], [3.]])
+        mask = np.array([False, True, False, True])
+        self.assertEqual(matrix.take(mask, columns=['1a']).ravel().tolist(), [1., 3.])
+        with self.assertRaises(KeyError):
+            matrix.take(columns=['unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from fold_runner import run_folds
+
+
+class TestRunFolds(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.X = rng.normal(size=(300, 4))
+        self.y = (self.X[:, 0] > 0).astype(int) + (self.X[:, 1] > 1).astype(int)
+        self.X_test = rng.normal(size=(50, 4))
+        self.row_folds = (np.arange(300) % 3).astype(np.int8)
+        self.row_folds[:10] = -1  # Not assigned to any fold
+        self.estimator = Pipeline([('scaler', MinMaxScaler()), ('clf', LogisticRegression())])
+
+    def test_run_folds(self):
+        result = run_folds(self.estimator, self.X, self.y, self.X_test, self.row_folds, n_jobs=1)
+        self.assertEqual(result.oof.shape, (300, 3))
+        self.assertEqual(result.test.shape, (50, 3))
+        self.assertTrue(np.isnan(result.oof[:10]).all())
+        self.assertFalse(np.isnan(result.oof[10:]).any())
+        self.assertTrue(np.allclose(result.oof[10:].sum(axis=1), 1.))
+        self.assertTrue(np.allclose(result.test.sum(axis=1), 1.))
+        self.assertEqual(len(result.models), 3)
+        self.assertEqual(len(result.metrics['valid']), 3)
+        self.assertEqual(result.classes.tolist(), [0, 1, 2])
+        # Same as fitting each fold
+        is_valid = self.row_folds == 1
+        expected = Pipeline([('scaler', MinMaxScaler()), ('clf', LogisticRegression())]) \
+            .fit(self.X[~is_valid], self.y[~is_valid]) \
+            .predict_proba(self.X[is_valid])
+        self.assertTrue(np.allclose(result.oof[is_valid], expected))
+
+    def test_parallel_is_same_as_sequential(self):
+        expected = run_folds(self.estimator, self.X, self.y, self.X_test, self.row_folds, n_jobs=1)
+        output = run_folds(self.estimator, self.X, self.y, self.X_test, self.row_folds, n_jobs=2)
+        self.assertTrue(np.allclose(output.oof, expected.oof, equal_nan=True))
+        self.assertTrue(np.allclose(output.test, expected.test))
+        self.assertEqual(output.metrics, expected.metrics)
+
+    def test_memory_mapped_features(self):
+        expected = run_folds(self.estimator, self.X, self.y, self.X_test, self.row_folds, n_jobs=1)
+        expected_view = run_folds(
+            self.estimator, self.X[10:], self.y[10:], self.X_test, self.row_folds[10:], n_jobs=1)
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, 'X.npy')
+            np.save(filepath, self.X)
+            X = np.load(filepath, mmap_mode='r')
+            output = run_folds(self.estimator, X, self.y, self.X_test, self.row_folds, n_jobs=2)
+            # View of memory-mapped array
+            output_view = run_folds(
+                self.estimator, X[10:], self.y[10:], self.X_test, self.row_folds[10:], n_jobs=1)
+        self.assertTrue(np.allclose(output.oof, expected.oof, equal_nan=True))
+        self.assertTrue(np.allclose(output.test, expected.test))
+        self.assertTrue(np.allclose(output_view.oof, expected_view.oof))
+
+
+if __name__ == '__main__':
+    unittest.main()
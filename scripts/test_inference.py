@@ -0,0 +1,50 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from inference import predict_test, write_submission
+
+
+class TestInference(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(200, 3))
+        y = np.digitize(X[:, 0], [-0.5, 0.5])
+        self.models = [
+            LogisticRegression().fit(X[i::3], y[i::3]) for i in range(3)
+        ] + [LogisticRegression().fit(X[y > 0], y[y > 0])]  # Knows classes 1 and 2 only
+        self.X_test = rng.normal(size=(50, 3))
+
+    def test_predict_test(self):
+        expected = np.zeros((50, 3))
+        expected[:, :] += sum(m.predict_proba(self.X_test) for m in self.models[:3])
+        expected[:, 1:] += self.models[3].predict_proba(self.X_test)
+        expected /= 4
+        for n_jobs in (1, 3):
+            proba = predict_test(self.models, self.X_test, batch_size=16, n_jobs=n_jobs)
+            self.assertEqual(proba.dtype, np.float32)
+            self.assertTrue(np.allclose(proba, expected, atol=1e-6))
+        proba = predict_test(self.models, pd.DataFrame(self.X_test), batch_size=7)
+        self.assertTrue(np.allclose(proba, expected, atol=1e-6))
+
+    def test_write_submission(self):
+        proba = np.array([[0.1, 0.9], [0.8, 0.2], [0.3, 0.7]], dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, 'submission.csv')
+            submission = write_submission(filepath, [2, 0, 1], proba, classes=np.array([3, 5]))
+            self.assertIsNone(pd.testing.assert_frame_equal(pd.read_csv(filepath), submission))
+        self.assertEqual(submission.id.tolist(), [0, 1, 2])
+        self.assertEqual(submission.y.tolist(), [3, 5, 5])
+        with tempfile.TemporaryDirectory() as tempdir:
+            submission = write_submission(
+                os.path.join(tempdir, 'submission.csv'), [2, 0, 1], proba, multipliers=[10., 1.])
+        self.assertEqual(submission.y.tolist(), [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
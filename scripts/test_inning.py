@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from inning import Inning
@@ -24,6 +25,21 @@ class TestInning(unittest.TestCase):
             with self.assertRaises(ValueError):
                 Inning.extract_info(input_)
 
+    def test_extract_info_column(self):
+        input_ = pd.Series(['1回表', '1回裏', '11回表', '1回表', '12回裏'], index=[5, 4, 3, 2, 1])
+        expected = pd.DataFrame({
+            'inningNo': np.array([1, 1, 11, 1, 12], dtype=np.int8),
+            'isBottom': np.array([0, 1, 0, 0, 1], dtype=np.int8),
+        }, index=[5, 4, 3, 2, 1])
+        output = Inning.extract_info_column(input_)
+        self.assertIsNone(pd.testing.assert_frame_equal(output, expected))
+
+    def test_extract_info_column_raise_value_error(self):
+        testdata = ['1回', '回表', '回裏', '1表', '一回表', '二回裏', np.nan]
+        for input_ in testdata:
+            with self.assertRaises(ValueError):
+                Inning.extract_info_column(pd.Series(['1回表', input_]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+from sklearn.metrics import confusion_matrix, f1_score
+
+from metrics import confusion_matrices, macro_f1
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.y_true = rng.integers(0, 4, size=100)
+        self.y_preds = rng.integers(0, 4, size=(5, 100))
+        self.y_preds[1] = self.y_true
+        self.y_preds[2] = 0  # Only 1 class is predicted
+
+    def test_confusion_matrices(self):
+        matrices = confusion_matrices(self.y_true, self.y_preds, 4)
+        self.assertEqual(matrices.shape, (5, 4, 4))
+        for matrix, y_pred in zip(matrices, self.y_preds):
+            self.assertTrue(np.array_equal(
+                matrix, confusion_matrix(self.y_true, y_pred, labels=np.arange(4))))
+
+    def test_macro_f1(self):
+        expected = [f1_score(self.y_true, y_pred, average='macro') for y_pred in self.y_preds]
+        self.assertTrue(np.allclose(macro_f1(self.y_true, self.y_preds, 4), expected))
+        # Classes not appearing are not averaged, as sklearn does
+        y_true, y_pred = np.array([0, 0, 2]), np.array([0, 2, 2])
+        self.assertAlmostEqual(
+            macro_f1(y_true, y_pred, 5)[0], f1_score(y_true, y_pred, average='macro'))
+
+
+if __name__ == '__main__':
+    unittest.main()
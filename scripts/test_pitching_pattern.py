@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 
 import pitching_pattern
@@ -91,5 +92,182 @@ class TestPitchingPattern(unittest.TestCase):
         self.assertEqual(output, expected)
 
 
+class TestPitchingPatternAll(unittest.TestCase):
+
+    def test_extract_patterns_all(self):
+        input_ = pd.DataFrame(
+            {
+                'gameID': [20202173, 20202173, 20202173, 20202173, 20202173, 20202173],
+                'inning': ['1回表', '1回表', '1回表', '1回表', '1回表', '1回表'],
+                'batterID': [4, 3, 3, 3, 3, 4],
+                'O': [1, 1, 1, 1, 1, 1],
+                'pitcherID': [1, 1, 1, 1, 1, 1],
+                'totalPitchingCount': [2, 1, 2, 3, 5, 1],
+                'ballPositionLabel': ['外角高め', '内角高め', '外角低め', '内角低め', '外角低め', 'ど真ん中'],
+                'ballXY': ['5B', '1X', '2Y', '3D', '11D', '6C'],
+                'pitchType': ['カーブ', 'カットファストボール', '-', 'ストレート', 'ストレート', 'カーブ'],
+            }
+        )
+        expected = pd.DataFrame(
+            {
+                'gameID': [20202173, 20202173],
+                'inning': ['1回表', '1回表'],
+                'pitcherID': [1, 1],
+                'batterID': [3, 4],
+                'O': [1, 1],
+                'ballPositionLabel': ['内角高め 外角低め 内角低め __NO_DATA__ 外角低め', 'ど真ん中 外角高め'],
+                'pitchType': ['カットファストボール - ストレート __NO_DATA__ ストレート', 'カーブ カーブ'],
+                'ballXY': ['1X 2Y 3D __NO_DATA__ 11D', '6C 5B'],
+            }
+        )
+        output = pitching_pattern.extract_patterns_all(input_)
+        self.assertIsNone(pd.testing.assert_frame_equal(output, expected, check_dtype=False))
+
+    def test_missing_at_bat_keys(self):
+        input_ = pd.DataFrame(
+            {
+                'gameID': [1, 1, 1, 1, 1],
+                'inning': ['1回表', '1回表', np.nan, np.nan, '1回表'],
+                'batterID': [3, 3, 3, 3, 3],
+                'O': [1, np.nan, 1, 1, np.nan],
+                'pitcherID': [1, 1, 1, 1, 1],
+                'totalPitchingCount': [1, 2, 2, 1, 1],
+                'ballPositionLabel': ['内角高め', '外角低め', 'ど真ん中', '内角低め', '外角高め'],
+                'ballXY': ['1X', '2Y', '3D', '5B', '6C'],
+                'pitchType': ['カーブ', '-', 'ストレート', 'カーブ', 'ストレート'],
+            }
+        )
+        expected = pd.DataFrame(
+            {
+                'gameID': [1, 1, 1],
+                'inning': ['1回表', '1回表', np.nan],
+                'pitcherID': [1, 1, 1],
+                'batterID': [3, 3, 3],
+                'O': [1, np.nan, 1],
+                'ballPositionLabel': ['内角高め', '外角高め 外角低め', '内角低め ど真ん中'],
+                'pitchType': ['カーブ', 'ストレート -', 'カーブ ストレート'],
+                'ballXY': ['1X', '6C 2Y', '5B 3D'],
+            }
+        )
+        output = pitching_pattern.extract_patterns_all(input_)
+        self.assertIsNone(pd.testing.assert_frame_equal(output, expected, check_dtype=False))
+
+    def test_same_as_extract_patterns(self):
+        rng = np.random.default_rng(1)
+        nrows = 2000
+        labels = np.array(['内角高め', '外角低め', 'ど真ん中', '-'], dtype=object)
+        input_ = pd.DataFrame(
+            {
+                'gameID': rng.integers(0, 5, nrows),
+                'inning': np.array(['1回表', '1回裏', '2回表'])[rng.integers(0, 3, nrows)],
+                'batterID': rng.integers(0, 5, nrows),
+                'O': rng.integers(0, 3, nrows),
+                'pitcherID': rng.integers(0, 3, nrows),
+                'totalPitchingCount': rng.integers(1, 8, nrows),
+                'ballPositionLabel': labels[rng.integers(0, 4, nrows)],
+                'ballXY': labels[rng.integers(0, 4, nrows)],
+                'pitchType': labels[rng.integers(0, 4, nrows)],
+            }
+        )
+        keys = list(pitching_pattern.AT_BAT_COLUMNS)
+        expected = [pitching_pattern.extract_patterns(at_bat)
+                    for _, at_bat in input_.groupby(keys, sort=True)]
+        expected = pd.DataFrame(expected)
+        output = pitching_pattern.extract_patterns_all(input_)
+        self.assertEqual(output.shape[0], input_.drop_duplicates(subset=keys).shape[0])
+        for c in pitching_pattern.PATTERN_COLUMNS:
+            self.assertEqual(output[c].tolist(), expected[c].tolist())
+
+    def test_extract_pattern_sequences(self):
+        input_ = pd.DataFrame(
+            {
+                'gameID': [1, 1, 1, 1, 1],
+                'inning': ['1回表', '1回表', '1回表', '1回表', '1回表'],
+                'batterID': [4, 3, 3, 3, 4],
+                'O': [1, 1, 1, 1, 1],
+                'pitcherID': [1, 1, 1, 1, 1],
+                'totalPitchingCount': [2, 1, 2, 4, 1],
+                'ballPositionLabel': ['外角高め', '内角高め', '外角低め', '外角低め', '内角高め'],
+                'ballXY': ['5B', '1X', '2Y', '11D', '6C'],
+                'pitchType': ['カーブ', 'カーブ', np.nan, 'ストレート', 'カーブ'],
+            }
+        )
+        at_bats, sequences = pitching_pattern.extract_pattern_sequences(input_)
+        self.assertEqual(at_bats.batterID.tolist(), [3, 4])
+        sequence = sequences['ballPositionLabel']
+        self.assertEqual(sequence.vocabulary[pitching_pattern.NO_RECORD_ID],
+                         pitching_pattern.NO_RECORD)
+        self.assertEqual(sequence.offsets.tolist(), [0, 4, 6])
+        self.assertEqual(sequence.values.dtype, np.int32)
+        self.assertEqual(sequence.vocabulary[sequence.values].tolist(),
+                         ['内角高め', '外角低め', '__NO_DATA__', '外角低め', '内角高め', '外角高め'])
+        self.assertEqual(sequence.join().tolist(),
+                         ['内角高め 外角低め __NO_DATA__ 外角低め', '内角高め 外角高め'])
+        counts = sequence.counts()
+        self.assertEqual(counts.shape, (2, sequence.vocabulary.size))
+        self.assertEqual(counts.sum(axis=1).tolist(), [4, 2])
+        self.assertEqual(counts[0, list(sequence.vocabulary).index('外角低め')], 2)
+        # Missing value is regarded as `NO_RECORD`
+        self.assertEqual(sequences['pitchType'].join().tolist(),
+                         ['カーブ __NO_DATA__ __NO_DATA__ ストレート', 'カーブ カーブ'])
+        # Reuse vocabulary, unknown value is regarded as `NO_RECORD`
+        vocabularies = {c: sequences[c].vocabulary for c in pitching_pattern.PATTERN_COLUMNS}
+        input_.loc[0, 'ballXY'] = '13A'
+        _, sequences = pitching_pattern.extract_pattern_sequences(input_, vocabularies)
+        self.assertIs(sequences['ballXY'].vocabulary, vocabularies['ballXY'])
+        self.assertEqual(sequences['ballXY'].join().tolist(),
+                         ['1X 2Y __NO_DATA__ 11D', '6C __NO_DATA__'])
+
+
+class TestZoneCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.entities = np.array([0, 0, 1, 0, 2, 1])
+        self.zones = pitching_pattern.zone_codes(
+            pd.Series([1, 1, 21, 2, np.nan, 1]), pd.Series(['a', 'a', 'k', 'b', 'a', 'a']))
+
+    def test_zone_codes(self):
+        codes = pitching_pattern.zone_codes(
+            pd.Series([1, 21, 2, np.nan, 22]), pd.Series(['a', 'k', 'b', 'a', 'a']))
+        zones = np.array(pitching_pattern.ZONES)
+        self.assertEqual(zones[codes[:3]].tolist(), ['1a', '21k', '2b'])
+        self.assertEqual(codes[3:].tolist(), [pitching_pattern.NO_ZONE] * 2)
+        # Upper case as in "ballY" of competition dataset
+        codes = pitching_pattern.zone_codes(
+            pd.Series([1, 11, 3]), pd.Series(['A', 'D', np.nan], dtype='category'))
+        self.assertEqual(zones[codes[:2]].tolist(), ['1a', '11d'])
+        self.assertEqual(codes[2], pitching_pattern.NO_ZONE)
+
+    def test_zone_histograms(self):
+        histograms = pitching_pattern.zone_histograms(self.entities, self.zones, num_entities=4)
+        self.assertEqual(histograms.shape, (4, len(pitching_pattern.ZONES)))
+        expected = pd.crosstab(
+            self.entities[self.zones >= 0],
+            np.array(pitching_pattern.ZONES)[self.zones[self.zones >= 0]])
+        for entity, row in expected.iterrows():
+            for zone, count in row.items():
+                self.assertEqual(histograms[entity, pitching_pattern.ZONES.index(zone)], count)
+        self.assertEqual(histograms.sum(), 5)  # Missing zone is not counted
+        self.assertEqual(histograms[3].sum(), 0)
+
+    def test_zone_counts(self):
+        counts = pitching_pattern.zone_counts(self.entities, self.zones)
+        column = pitching_pattern.ZONES.index('1a')
+        self.assertEqual(counts[:, column].tolist(), [2, 2, 1, 2, 0, 1])
+
+    def test_leave_fold_out(self):
+        row_folds = np.array([0, 1, 1, -1, 0, 0])
+        counts = pitching_pattern.zone_counts(self.entities, self.zones, row_folds=row_folds)
+        # Same as counting training folds of each row
+        for i, fold in enumerate(row_folds):
+            is_train = row_folds != fold if fold >= 0 else np.ones(row_folds.size, dtype=bool)
+            expected = pitching_pattern.zone_histograms(
+                self.entities[is_train], self.zones[is_train], num_entities=3)[self.entities[i]]
+            self.assertEqual(counts[i].tolist(), expected.tolist())
+        # Without unassigned rows
+        counts = pitching_pattern.zone_counts(self.entities, self.zones, row_folds=row_folds + 1)
+        self.assertEqual(counts[0, pitching_pattern.ZONES.index('1a')], 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,57 @@
+import os
+import os.path
+import tempfile
+import time
 import unittest
 
 import numpy as np
 import pandas as pd
 
-from players import PlayersID, Hand, GameParticipation
+from players import PlayersID, PlayerRegistry, Hand, GameParticipation, PlayerState
+
+
+def is_pitcher_hand_left_per_id(pitchers: pd.DataFrame) -> pd.Series:
+    '''Former implementation of `Hand.is_pitcher_hand_left`, kept as a reference.'''
+    pitcher_ids = pitchers.pitcherID.unique()
+    mode_list = [
+        Hand.LEFT
+        if pitchers.query(f'pitcherID == {id_}').pitcherHand.mode()[0] == 'L' else Hand.RIGHT
+        for id_ in pitcher_ids]
+    most_frequent_hand = dict(zip(pitcher_ids, mode_list))
+    return pitchers.pitcherID.apply(lambda id_: most_frequent_hand[id_])
+
+
+def is_batter_hand_left_per_id(batters: pd.DataFrame) -> pd.Series:
+    '''Former implementation of `Hand.is_batter_hand_left`, kept as a reference.'''
+    num_unique_hand = dict(batters.groupby('batterID').batterHand.nunique())
+    batter_ids = batters.batterID.unique()
+    mode_list = [batters.query(f'batterID == {id_}').batterHand.mode() for id_ in batter_ids]
+    most_frequent_hand = dict(zip(batter_ids, mode_list))
+
+    def _impute_batter_hand(s: pd.Series) -> int:
+        if num_unique_hand[s.batterID] == 1:
+            return Hand.RIGHT if most_frequent_hand[s.batterID][0] == 'R' else Hand.LEFT
+        else:
+            return Hand.RIGHT if s.isPitcherHandLeft == Hand.LEFT else Hand.LEFT
+
+    return batters.apply(_impute_batter_hand, axis=1)
+
+
+def make_hands(nrows: int, nplayers: int) -> pd.DataFrame:
+    '''Random pitches having hands of pitchers and batters, and `isPitcherHandLeft`.'''
+    rng = np.random.default_rng(1)
+    hands = np.array(['L', 'R', np.nan], dtype=object)
+    input_ = pd.DataFrame({
+        'pitcherID': rng.integers(0, nplayers, nrows),
+        'pitcherHand': hands[rng.choice(3, nrows, p=[0.45, 0.45, 0.1])],
+        'batterID': rng.integers(0, nplayers, nrows),
+        'batterHand': hands[rng.choice(3, nrows, p=[0.45, 0.45, 0.1])],
+    })
+    # Some batters always bat on one side
+    one_side = input_.batterID < nplayers // 2
+    input_.loc[one_side, 'batterHand'] = np.where(input_[one_side].batterID % 2 == 0, 'L', 'R')
+    input_['isPitcherHandLeft'] = Hand.is_pitcher_hand_left(input_)
+    return input_
 
 
 class TestAssignPlayerID(unittest.TestCase):
@@ -79,6 +127,66 @@ class TestAssignPlayerID(unittest.TestCase):
         self.assertEqual(output, expected)
 
 
+class TestPlayerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        pitchers = pd.DataFrame({
+            'pitcher': ['A', 'B', 'ＤＪ．ジョンソン', 'ＤＪ．ジョンソン'],
+            'pitcherTeam': [1, 2, 4, 5]
+        })
+        batters = pd.DataFrame({
+            'batter': ['C', 'A'],
+            'batterTeam': [3, 1]
+        })
+        self.player_ids = PlayersID(pitchers=pitchers, batters=batters).assign()
+
+    def test_same_as_assign(self):
+        registry = PlayerRegistry.from_player_ids(self.player_ids)
+        self.assertEqual(len(registry), 5)
+        output = registry.map(self.player_ids.player, self.player_ids.team)
+        self.assertEqual(output.tolist(), self.player_ids.playerID.tolist())
+        self.assertIsNone(pd.testing.assert_frame_equal(registry.to_frame(), self.player_ids))
+
+    def test_append_only(self):
+        registry = PlayerRegistry.from_player_ids(self.player_ids)
+        max_id = self.player_ids.playerID.max()
+        players = pd.Series(['G', 'A', 'ＤＪ．ジョンソン', '小林 慶祐', '小林 慶祐', 'H'])
+        teams = pd.Series([6, 1, 7, 7, 8, 1])
+        output = registry.assign(players, teams)
+        self.assertEqual(output.tolist(), [
+            max_id + 2,  # New players are numbered in (team, player) order
+            registry.map(pd.Series(['A']), pd.Series([1]))[0],  # Existing ID is kept
+            registry.map(pd.Series(['ＤＪ．ジョンソン']), pd.Series([4]))[0],  # Transferred
+            max_id + 3,
+            max_id + 3,  # Transferred
+            max_id + 1,
+        ])
+        # Existing IDs are kept
+        output = registry.map(self.player_ids.player, self.player_ids.team)
+        self.assertEqual(output.tolist(), self.player_ids.playerID.tolist())
+
+    def test_configurable_transferred_players(self):
+        registry = PlayerRegistry(transferred_players=['X'])
+        output = registry.assign(pd.Series(['X', 'X', 'ＤＪ．ジョンソン', 'ＤＪ．ジョンソン']),
+                                 pd.Series([1, 2, 1, 2]))
+        self.assertEqual(output.tolist(), [0, 0, 1, 2])
+
+    def test_save_and_load(self):
+        registry = PlayerRegistry.from_player_ids(self.player_ids)
+        registry.register(pd.Series(['G']), pd.Series([6]))
+        with tempfile.TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, 'registry.pickle')
+            registry.save(filepath)
+            loaded = PlayerRegistry.load(filepath)
+        self.assertIsNone(pd.testing.assert_frame_equal(loaded.to_frame(), registry.to_frame()))
+        self.assertEqual(loaded.transferred_players, registry.transferred_players)
+
+    def test_not_registered(self):
+        registry = PlayerRegistry.from_player_ids(self.player_ids)
+        with self.assertRaises(KeyError):
+            registry.map(pd.Series(['A', 'Z']), pd.Series([1, 1]))
+
+
 class TestHand(unittest.TestCase):
 
     def test_impute_pitcher_hand(self):
@@ -157,6 +265,34 @@ class TestHand(unittest.TestCase):
         output = Hand.is_batter_hand_left(input_)
         self.assertIsNone(pd.testing.assert_series_equal(output, expected, check_names=False))
 
+    def test_same_as_per_id(self):
+        '''Same output as per-id implementation on many players.'''
+        input_ = make_hands(nrows=20000, nplayers=300)
+        expected_pitcher = is_pitcher_hand_left_per_id(input_)
+        expected_batter = is_batter_hand_left_per_id(input_)
+        output_pitcher = Hand.is_pitcher_hand_left(input_)
+        output_batter = Hand.is_batter_hand_left(input_)
+        self.assertIsNone(pd.testing.assert_series_equal(
+            output_pitcher, expected_pitcher, check_names=False))
+        self.assertIsNone(pd.testing.assert_series_equal(
+            output_batter, expected_batter, check_names=False))
+
+    @unittest.skipUnless(os.environ.get('RUN_BENCHMARK'), 'Set RUN_BENCHMARK=1 to run benchmark')
+    def test_benchmark(self):
+        '''Speedup over per-id implementation on input of the size of the competition dataset.'''
+        input_ = make_hands(nrows=200000, nplayers=3000)
+        start = time.perf_counter()
+        is_pitcher_hand_left_per_id(input_)
+        is_batter_hand_left_per_id(input_)
+        elapsed_per_id = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Hand.is_pitcher_hand_left(input_)
+        Hand.is_batter_hand_left(input_)
+        elapsed_vectorized = time.perf_counter() - start
+        print(f'per id: {elapsed_per_id:.3f}s, vectorized: {elapsed_vectorized:.3f}s, '
+              f'speedup: {elapsed_per_id / elapsed_vectorized:.1f}x')
+
 
 class TestGameParticipant(unittest.TestCase):
 
@@ -268,6 +404,76 @@ class TestGameParticipant(unittest.TestCase):
         output = game_participation.hours_elapsed_from_last(calc_pitcher=False)
         self.assertIsNone(pd.testing.assert_frame_equal(expected, output))
 
+    def test_hours_elapsed_from_last_all(self):
+        '''`gameID` order differs from `startDayTime` order, and `startDayTime` is str.'''
+        input_ = pd.DataFrame({
+            'gameID': [3, 3, 1, 1, 2, 2],
+            'startDayTime': [
+                '2020-05-01 10:00:00', '2020-05-01 10:00:00',
+                '2020-05-02 10:00:00', '2020-05-02 10:00:00',
+                '2020-05-03 12:00:00', '2020-05-03 12:00:00',
+            ],
+            'pitcherID': [1, 1, 1, 1, 2, 2],
+            'batterID': [10, 20, 10, 10, 10, 20],
+        })
+        game_participation = GameParticipation(data=input_)
+        output_pitcher, output_batter = game_participation.hours_elapsed_from_last_all()
+        expected_pitcher = pd.DataFrame({
+            'pitcherID': [1, 1, 2],
+            'gameID': [1, 3, 2],
+            'hoursElapsed': [24, np.nan, np.nan],
+            'numGamesParticipated': [2, 1, 1],
+        })
+        expected_batter = pd.DataFrame({
+            'batterID': [10, 10, 10, 20, 20],
+            'gameID': [1, 2, 3, 2, 3],
+            'hoursElapsed': [24, 26, np.nan, 50, np.nan],
+            'numGamesParticipated': [2, 3, 1, 2, 1],
+        })
+        self.assertIsNone(pd.testing.assert_frame_equal(expected_pitcher, output_pitcher))
+        self.assertIsNone(pd.testing.assert_frame_equal(expected_batter, output_batter))
+
+
+class TestPlayerState(unittest.TestCase):
+
+    def test_same_as_whole_data(self):
+        input_ = pd.DataFrame({
+            'gameID': [1, 1, 2, 2, 3, 3, 4, 4],
+            'startDayTime': pd.to_datetime([
+                '2020-05-01 10:00:00', '2020-05-01 10:00:00',
+                '2020-05-02 10:00:00', '2020-05-02 10:00:00',
+                '2020-05-04 18:00:00', '2020-05-04 18:00:00',
+                '2020-05-05 18:00:00', '2020-05-05 18:00:00',
+            ]),
+            'pitcherID': [1, 2, 1, 3, 1, 2, 3, 3],
+            'pitcherHand': ['R', 'L', 'L', 'R', 'L', np.nan, 'R', 'R'],
+            'batterID': [10, 20, 10, 20, 30, 20, 10, 30],
+            'batterHand': ['L', 'R', 'R', 'R', np.nan, 'R', 'R', 'L'],
+        })
+        input_['isPitcherHandLeft'] = Hand.is_pitcher_hand_left(input_)
+        game_participation = GameParticipation(input_)
+        state = PlayerState()
+        chunks = [input_.iloc[:4], input_.iloc[4:6], input_.iloc[6:]]
+        for chunk in chunks:
+            state.add_hand_counts('pitcherID', Hand.count_hands(chunk.pitcherID, chunk.pitcherHand))
+            state.add_hand_counts('batterID', Hand.count_hands(chunk.batterID, chunk.batterHand))
+        # hands
+        self.assertIsNone(pd.testing.assert_series_equal(
+            state.is_pitcher_hand_left(input_.pitcherID), Hand.is_pitcher_hand_left(input_)))
+        self.assertIsNone(pd.testing.assert_series_equal(
+            state.is_batter_hand_left(input_.batterID, input_.isPitcherHandLeft),
+            Hand.is_batter_hand_left(input_)))
+        # participation
+        for calc_pitcher in (True, False):
+            id_column = 'pitcherID' if calc_pitcher else 'batterID'
+            expected = game_participation.hours_elapsed_from_last(calc_pitcher=calc_pitcher)
+            output = pd.concat(
+                [state.hours_elapsed_from_last(chunk, calc_pitcher=calc_pitcher)
+                 for chunk in chunks]) \
+                .sort_values([id_column, 'gameID']) \
+                .reset_index(drop=True)
+            self.assertIsNone(pd.testing.assert_frame_equal(output, expected))
+
 
 if __name__ == '__main__':
     unittest.main()
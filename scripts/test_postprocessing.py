@@ -0,0 +1,62 @@
+import time
+import unittest
+
+import numpy as np
+from sklearn.metrics import f1_score
+
+from postprocessing import ClassMultipliers, _line_search
+
+
+class TestClassMultipliers(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        # Imbalanced classes, the rare class is under-predicted
+        self.y = rng.choice(4, size=2000, p=[0.5, 0.3, 0.17, 0.03])
+        logits = rng.normal(size=(2000, 4)) + np.eye(4)[self.y] * 1.5 \
+            + np.log([0.5, 0.3, 0.17, 0.03])
+        self.proba = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+
+    def test_fit(self):
+        optimizer = ClassMultipliers().fit(self.proba, self.y)
+        initial = f1_score(self.y, self.proba.argmax(axis=1), average='macro')
+        self.assertAlmostEqual(optimizer.initial_score_, initial)
+        self.assertGreater(optimizer.score_, initial)
+        self.assertAlmostEqual(
+            optimizer.score_, f1_score(self.y, optimizer.predict(self.proba), average='macro'))
+        self.assertEqual(optimizer.multipliers_.max(), 1.)
+        # Rare class is weighted more
+        self.assertEqual(np.argmax(optimizer.multipliers_), 3)
+
+    def test_line_search(self):
+        multipliers = np.ones(4)
+        value, score = _line_search(self.proba, self.y, multipliers, 3)
+        # Best among brute force candidates
+        candidates = np.logspace(-2, 2, 200)
+        scores = []
+        for c in candidates:
+            multipliers[3] = c
+            scores.append(
+                f1_score(self.y, np.argmax(self.proba * multipliers, axis=1), average='macro'))
+        multipliers[3] = value
+        self.assertAlmostEqual(
+            score, f1_score(self.y, np.argmax(self.proba * multipliers, axis=1), average='macro'))
+        self.assertGreaterEqual(score, max(scores) - 1e-12)
+
+    def test_classes_and_missing_rows(self):
+        proba = self.proba.copy()
+        proba[:10] = np.nan
+        optimizer = ClassMultipliers().fit(proba, self.y + 1, classes=np.arange(1, 5))
+        self.assertTrue(set(optimizer.predict(self.proba)) <= {1, 2, 3, 4})
+        with self.assertRaises(AttributeError):
+            ClassMultipliers().predict(self.proba)
+
+    def test_speed(self):
+        start = time.perf_counter()
+        _line_search(self.proba, self.y, np.ones(4), 3)
+        # Macro F1 of every breakpoint (2000 candidates) is evaluated at once
+        self.assertLess(time.perf_counter() - start, 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+
+import stacking
+
+
+class TestStacking(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        self.y = rng.integers(0, 3, size=60)
+        self.train_ids = np.arange(60)
+        self.test_ids = np.arange(10)
+        self.row_folds = (np.arange(60) % 3).astype(np.int8)
+        # Good model, noisy model and a model predicting classes 0 and 1 only in shuffled order
+        good = np.eye(3)[self.y] * 0.6 + rng.random((60, 3)) * 0.5
+        noisy = rng.random((60, 3))
+        partial = rng.random((60, 2))
+        shuffled = rng.permutation(60)
+        self.exp_dirs = [
+            os.path.join(self.tempdir.name, name) for name in ('good', 'noisy', 'partial')]
+        stacking.save_predictions(
+            self.exp_dirs[0], self.train_ids, good, self.test_ids, rng.random((10, 3)),
+            np.arange(3))
+        stacking.save_predictions(
+            self.exp_dirs[1], self.train_ids[5:], noisy[5:], self.test_ids, rng.random((10, 3)),
+            np.arange(3))
+        stacking.save_predictions(
+            self.exp_dirs[2], self.train_ids[shuffled], partial[shuffled],
+            self.test_ids[::-1], rng.random((10, 2)), np.arange(2))
+        self.good, self.noisy, self.partial = good, noisy, partial
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_predictions(self):
+        predictions = stacking.load_predictions(self.exp_dirs, self.train_ids, self.test_ids)
+        self.assertEqual(predictions.oof.shape, (3, 60, 3))
+        self.assertEqual(predictions.test.shape, (3, 10, 3))
+        self.assertEqual(predictions.oof.dtype, np.float32)
+        self.assertEqual(predictions.classes.tolist(), [0, 1, 2])
+        self.assertTrue(np.allclose(predictions.oof[0], self.good))
+        self.assertTrue(np.isnan(predictions.oof[1, :5]).all())
+        self.assertTrue(np.allclose(predictions.oof[1, 5:], self.noisy[5:]))
+        self.assertTrue(np.allclose(predictions.oof[2, :, :2], self.partial))
+        self.assertTrue((predictions.oof[2, :, 2] == 0).all())
+        with self.assertRaises(KeyError):
+            stacking.load_predictions(self.exp_dirs, self.train_ids, np.arange(11))
+
+    def test_search_blend_weights(self):
+        predictions = stacking.load_predictions(self.exp_dirs, self.train_ids, self.test_ids)
+        result = stacking.search_blend_weights(predictions, self.y, num_candidates=50)
+        self.assertEqual(result.weights.shape, (3,))
+        # Score of the best candidate
+        blended = stacking.blend(result.weights, predictions.oof[:, 5:])
+        expected = f1_score(self.y[5:], np.argmax(blended, axis=1), average='macro')
+        self.assertAlmostEqual(result.score, expected)
+        self.assertGreaterEqual(
+            result.score, f1_score(self.y[5:], self.good[5:].argmax(axis=1), average='macro'))
+
+    def test_fit_meta_model(self):
+        predictions = stacking.load_predictions(self.exp_dirs, self.train_ids, self.test_ids)
+        result = stacking.fit_meta_model(
+            LogisticRegression(), predictions, self.y, self.row_folds, n_jobs=1)
+        self.assertEqual(result.oof.shape, (60, 3))
+        self.assertTrue(np.isnan(result.oof[:5]).all())
+        self.assertFalse(np.isnan(result.oof[5:]).any())
+        self.assertEqual(result.test.shape, (10, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os.path
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import streaming
+from players import PlayersID, PlayerRegistry, Hand, GameParticipation
+
+
+def make_raw_data(ngames: int = 12, nrows: int = 600, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    starts = pd.Timestamp('2020-06-19 18:00:00') \
+        + pd.to_timedelta(rng.integers(0, 30, ngames), unit='D') \
+        + pd.to_timedelta(rng.choice([0, 4], ngames), unit='h')
+    game_info = pd.DataFrame({
+        'gameID': np.arange(ngames) + 20202000,
+        'startDayTime': starts.strftime('%Y-%m-%d %H:%M:%S'),
+        'bgTop': rng.integers(1, 5, ngames),
+        'bgBottom': rng.integers(5, 9, ngames),
+    })
+    players = np.array(['A', 'B', 'C', 'D', 'E', 'ＤＪ．ジョンソン'], dtype=object)
+    hands = np.array(['L', 'R', np.nan], dtype=object)
+    pitches = pd.DataFrame({
+        'id': np.arange(nrows),
+        'gameID': rng.choice(game_info.gameID.values, nrows),
+        'inning': np.array(['1回表', '1回裏', '9回表'])[rng.integers(0, 3, nrows)],
+        'b1': rng.choice([True, False], nrows),
+        'b2': rng.choice([True, False], nrows),
+        'b3': rng.choice([True, False], nrows),
+        'pitcher': players[rng.integers(0, 6, nrows)],
+        'pitcherHand': hands[rng.integers(0, 3, nrows)],
+        'batter': players[rng.integers(0, 6, nrows)],
+        'batterHand': hands[rng.integers(0, 3, nrows)],
+        'ballX': rng.integers(1, 22, nrows),
+        'ballY': np.array(['A', 'B', 'C'])[rng.integers(0, 3, nrows)],
+    })
+    # Duplicate rows which have different `id`
+    duplicates = pitches.iloc[:20].assign(id=np.arange(nrows, nrows + 20))
+    pitches = pd.concat([pitches, duplicates], ignore_index=True)
+    return pitches, game_info
+
+
+def preprocess_in_memory(pitches: pd.DataFrame, game_info: pd.DataFrame) -> pd.DataFrame:
+    '''Reference implementation which processes whole data at once.'''
+    pitches = pitches.drop_duplicates(subset=[c for c in pitches.columns if c != 'id'])
+    game_info = game_info.assign(startDayTime=pd.to_datetime(game_info.startDayTime))
+    df = streaming.transform_rows(pitches.copy(), game_info)
+    registry = PlayerRegistry.from_player_ids(PlayersID(pitchers=df, batters=df).assign())
+    df = streaming.assign_player_ids(df, registry)
+    df['isPitcherHandLeft'] = Hand.is_pitcher_hand_left(df)
+    df['isBatterHandLeft'] = Hand.is_batter_hand_left(df)
+    game_participation = GameParticipation(df)
+    for role, calc_pitcher in (('pitcher', True), ('batter', False)):
+        participation = game_participation.hours_elapsed_from_last(calc_pitcher=calc_pitcher) \
+            .rename(columns={
+                'hoursElapsed': f'{role}HoursElapsed',
+                'numGamesParticipated': f'{role}NumGamesParticipated'})
+        df = pd.merge(df, participation, on=[f'{role}ID', 'gameID'], how='left')
+    return df
+
+
+class TestPreprocessInChunks(unittest.TestCase):
+
+    def test_same_as_in_memory(self):
+        pitches, game_info = make_raw_data()
+        expected = preprocess_in_memory(pitches, game_info) \
+            .sort_values('id') \
+            .reset_index(drop=True)
+        with tempfile.TemporaryDirectory() as tempdir:
+            pitch_csv = os.path.join(tempdir, 'pitches.csv')
+            game_info_csv = os.path.join(tempdir, 'game_info.csv')
+            pitches.to_csv(pitch_csv, index=False)
+            game_info.to_csv(game_info_csv)
+            out_dir = os.path.join(tempdir, 'out')
+            streaming.preprocess_in_chunks(pitch_csv, game_info_csv, out_dir, chunksize=70)
+            self.assertFalse(os.path.exists(os.path.join(out_dir, streaming.STAGING_DIRNAME)))
+            output = streaming.read_partitions(out_dir) \
+                .sort_values('id') \
+                .reset_index(drop=True)
+        self.assertIsNone(pd.testing.assert_frame_equal(
+            output[expected.columns], expected, check_dtype=False))
+
+
+class TestUpdateGameDays(unittest.TestCase):
+
+    def test_update_game_days(self):
+        pitches, game_info = make_raw_data()
+        expected = preprocess_in_memory(pitches, game_info) \
+            .sort_values('id') \
+            .reset_index(drop=True)
+        # Split into past and new game days
+        game_days = pd.to_datetime(game_info.startDayTime).dt.strftime('%Y%m%d')
+        last_date = sorted(game_days.unique())[-3]
+        new_game_ids = game_info.gameID[game_days > last_date]
+        is_new = pitches.gameID.isin(new_game_ids)
+        with tempfile.TemporaryDirectory() as tempdir:
+            pitch_csv = os.path.join(tempdir, 'pitches.csv')
+            game_info_csv = os.path.join(tempdir, 'game_info.csv')
+            pitches[~is_new].to_csv(pitch_csv, index=False)
+            game_info.to_csv(game_info_csv)
+            out_dir = os.path.join(tempdir, 'out')
+            streaming.preprocess_in_chunks(pitch_csv, game_info_csv, out_dir, chunksize=70)
+            dates = streaming.update_game_days(
+                pitches[is_new], game_info[game_info.gameID.isin(new_game_ids)], out_dir)
+            self.assertEqual(len(dates), 2)
+            self.assertTrue(all(d > last_date for d in dates))
+            output = streaming.read_partitions(out_dir) \
+                .sort_values('id') \
+                .reset_index(drop=True)
+            # Same days again
+            with self.assertRaises(ValueError):
+                streaming.update_game_days(pitches[is_new], game_info, out_dir)
+        self.assertEqual(output.shape[0], expected.shape[0])
+        # IDs of the same player are the same
+        for role in ('pitcher', 'batter'):
+            self.assertTrue(
+                (output.groupby([role, f'{role}Team'])[f'{role}ID'].nunique() == 1).all())
+            self.assertEqual(output[f'{role}ID'].nunique(), expected[f'{role}ID'].nunique())
+        # New rows are the same as processing all game days at once
+        is_new_row = output.gameID.isin(new_game_ids)
+        columns = [
+            'isPitcherHandLeft', 'isBatterHandLeft',
+            'pitcherHoursElapsed', 'pitcherNumGamesParticipated',
+            'batterHoursElapsed', 'batterNumGamesParticipated',
+        ]
+        self.assertIsNone(pd.testing.assert_frame_equal(
+            output.loc[is_new_row, columns], expected.loc[is_new_row, columns], check_dtype=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
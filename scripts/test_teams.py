@@ -46,6 +46,33 @@ class TestTeams(unittest.TestCase):
         output = Teams.extract_batter_team(input_)
         self.assertEqual(output, expected)
 
+    def test_extract_teams(self):
+        input_ = pd.DataFrame({
+            'bgTop': [6, 6, 3],
+            'bgBottom': [7, 7, 2],
+            'isBottom': [0, 1, 1]
+        }, index=[10, 11, 12])
+        expected = pd.DataFrame({
+            'batterTeam': [6, 7, 2],
+            'pitcherTeam': [7, 6, 3],
+        }, index=[10, 11, 12])
+        output = Teams.extract_teams(input_)
+        self.assertIsNone(pd.testing.assert_frame_equal(output, expected))
+        # Same as row-wise extraction
+        self.assertEqual(output.batterTeam.tolist(),
+                         input_.apply(Teams.extract_batter_team, axis=1).tolist())
+        self.assertEqual(output.pitcherTeam.tolist(),
+                         input_.apply(Teams.extract_pitcher_team, axis=1).tolist())
+
+    def test_extract_teams_raise_value_error(self):
+        input_ = pd.DataFrame({
+            'bgTop': [6, 6],
+            'bgBottom': [7, 7],
+            'isBottom': [0, 2]
+        })
+        with self.assertRaises(ValueError):
+            Teams.extract_teams(input_)
+
 
 if __name__ == '__main__':
     unittest.main()
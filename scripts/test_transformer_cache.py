@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.decomposition import PCA
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from fold_runner import run_folds
+from transformer_cache import TransformerCache, array_fingerprint
+
+
+class CountingScaler(BaseEstimator, TransformerMixin):
+    num_fits = 0
+
+    def __init__(self, scale: float = 2.):
+        self.scale = scale
+
+    def fit(self, X, y=None):
+        CountingScaler.num_fits += 1
+        self.n_features_in_ = np.shape(X)[1]
+        return self
+
+    def transform(self, X):
+        return np.asarray(X) * self.scale
+
+
+class TestTransformerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = TransformerCache(self.tempdir.name)
+        self.X = np.arange(12, dtype=float).reshape(4, 3)
+        CountingScaler.num_fits = 0
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_key(self):
+        pipeline = Pipeline([('scaler', MinMaxScaler()), ('pca', PCA(0.9, whiten=True))])
+        key = TransformerCache.key(pipeline, 0, 'abc', ['a', 'b'])
+        self.assertEqual(
+            TransformerCache.key(
+                Pipeline([('scaler', MinMaxScaler()), ('pca', PCA(0.9, whiten=True))]),
+                0, 'abc', ['a', 'b']),
+            key)
+        self.assertNotEqual(TransformerCache.key(pipeline, 1, 'abc', ['a', 'b']), key)
+        self.assertNotEqual(TransformerCache.key(pipeline, 0, 'abd', ['a', 'b']), key)
+        self.assertNotEqual(TransformerCache.key(pipeline, 0, 'abc', ['a', 'c']), key)
+        pipeline.set_params(pca__whiten=False)
+        self.assertNotEqual(TransformerCache.key(pipeline, 0, 'abc', ['a', 'b']), key)
+
+    def test_fit_transform(self):
+        key = TransformerCache.key(CountingScaler(), 0, array_fingerprint(self.X))
+        for _ in range(2):
+            fitted, Xt, others = self.cache.fit_transform(
+                CountingScaler(), key, self.X, others={'test': self.X[:2]})
+            self.assertIsInstance(fitted, CountingScaler)
+            self.assertTrue(np.array_equal(Xt, self.X * 2))
+            self.assertTrue(np.array_equal(others['test'], self.X[:2] * 2))
+        self.assertEqual(CountingScaler.num_fits, 1)
+        self.assertEqual(os.listdir(self.tempdir.name), [key])
+
+    def test_existing_entry_is_kept(self):
+        key = TransformerCache.key(CountingScaler(), 0, array_fingerprint(self.X))
+        self.cache.fit_transform(CountingScaler(), key, self.X)
+        entry_dir = os.path.join(self.tempdir.name, key)
+        # Another process having written the same entry concurrently
+        self.cache._write(entry_dir, CountingScaler(3.), {'fit': self.X * 3})
+        fitted, Xt, _ = self.cache.fit_transform(CountingScaler(), key, self.X)
+        self.assertEqual(fitted.scale, 2.)
+        self.assertTrue(np.array_equal(Xt, self.X * 2))
+        self.assertEqual(os.listdir(self.tempdir.name), [key])
+
+    def test_other_outputs_are_added(self):
+        key = TransformerCache.key(CountingScaler(), 0, array_fingerprint(self.X))
+        self.cache.fit_transform(CountingScaler(), key, self.X)
+        fitted, Xt, others = self.cache.fit_transform(
+            CountingScaler(), key, self.X, others={'test': self.X[:2]})
+        self.assertTrue(np.array_equal(others['test'], self.X[:2] * 2))
+        self.assertEqual(CountingScaler.num_fits, 1)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tempdir.name, key))),
+            ['fit.npy', 'test.npy', 'transformer.pickle'])
+
+    def test_array_fingerprint(self):
+        self.assertEqual(array_fingerprint(self.X), array_fingerprint(self.X.copy()))
+        self.assertNotEqual(array_fingerprint(self.X), array_fingerprint(self.X.astype(np.float32)))
+        self.assertNotEqual(array_fingerprint(self.X), array_fingerprint(self.X.reshape(3, 4)))
+
+    def test_run_folds(self):
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(90, 3))
+        y = (X[:, 0] > 0).astype(int)
+        row_folds = (np.arange(90) % 3).astype(np.int8)
+        X_test = rng.normal(size=(10, 3))
+        expected = run_folds(
+            Pipeline([('scaler', CountingScaler()), ('clf', LogisticRegression())]),
+            X, y, X_test, row_folds, n_jobs=1)
+        CountingScaler.num_fits = 0
+        for clf in (LogisticRegression(), LogisticRegression(), LogisticRegression(C=0.1)):
+            output = run_folds(
+                Pipeline([('scaler', CountingScaler()), ('clf', clf)]),
+                X, y, X_test, row_folds, n_jobs=1, cache_dir=self.tempdir.name)
+        # Preprocessor is fitted only in the first run
+        self.assertEqual(CountingScaler.num_fits, 3)
+        self.assertEqual(len(os.listdir(self.tempdir.name)), 3)
+        self.assertIsInstance(output.models[0], Pipeline)
+        self.assertTrue(np.array_equal(
+            output.models[0].predict(X_test), output.models[0][-1].predict(X_test * 2)))
+        output = run_folds(
+            Pipeline([('scaler', CountingScaler()), ('clf', LogisticRegression())]),
+            X, y, X_test, row_folds, n_jobs=1, cache_dir=self.tempdir.name)
+        self.assertTrue(np.allclose(output.oof, expected.oof))
+        self.assertTrue(np.allclose(output.test, expected.test))
+
+
+if __name__ == '__main__':
+    unittest.main()
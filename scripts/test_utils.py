@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils import DataFrame
+
+
+class TestDataFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.train = pd.DataFrame({
+            'id': [0, 1, 2],
+            'B': [1, 2, 3],
+            'y': [0, 7, 1],
+        })
+        self.test = pd.DataFrame({
+            'id': [0, 1],
+            'B': [0, 3],
+        }, index=[5, 6])
+
+    def test_round_trip(self):
+        train, test = self.train.copy(), self.test.copy()
+        merged = DataFrame.merge(train, test)
+        self.assertEqual(merged.shape[0], 5)
+        # Inputs are not modified
+        self.assertIsNone(pd.testing.assert_frame_equal(train, self.train))
+        self.assertIsNone(pd.testing.assert_frame_equal(test, self.test))
+        output_train, output_test = DataFrame.purge(merged)
+        self.assertIsNone(pd.testing.assert_frame_equal(output_train, self.train))
+        self.assertIsNone(pd.testing.assert_frame_equal(output_test, self.test))
+
+    def test_joint_transform(self):
+        merged = DataFrame.merge(self.train, self.test)
+        merged['rankB'] = merged.B.rank()
+        merged = merged.sample(frac=1., random_state=1)  # Order of rows is changed
+        output_train, output_test = DataFrame.purge(merged)
+        self.assertEqual(output_train.sort_index().rankB.tolist(), [2., 3., 4.5])
+        self.assertEqual(output_test.sort_index().rankB.tolist(), [1., 4.5])
+        self.assertEqual(output_train.y.dtype, np.int64)
+        self.assertNotIn('y', output_test.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
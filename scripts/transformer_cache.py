@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import os.path
+import pickle
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+TRANSFORMER_FILENAME = 'transformer.pickle'
+FIT_OUTPUT_NAME = 'fit'
+
+
+class TransformerCache(object):
+    '''Fitted transformers and their outputs on disk, addressed by content.
+
+    Entry of key `k` is "{cache_dir}/{k}/" having the pickled fitted transformer and .npy of
+    transformed arrays. Key is made from parameters of the transformer, feature names, fold and
+    fingerprint of data (see `key`), so experiments which differ only in the estimator after the
+    transformer share the entries.
+    '''
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(
+            transformer: TransformerMixin,
+            fold: int,
+            fingerprint: str,
+            feature_names: Optional[List[str]] = None) -> str:
+        '''Hash of class and all (nested) parameters of `transformer`, features, fold and data.'''
+        sha1 = hashlib.sha1(_describe(transformer).encode())
+        sha1.update(json.dumps(
+            [feature_names, int(fold), fingerprint], ensure_ascii=False, default=str).encode())
+        return sha1.hexdigest()
+
+    def fit_transform(
+            self,
+            transformer: TransformerMixin,
+            key: str,
+            X: np.ndarray,
+            y: Optional[np.ndarray] = None,
+            others: Optional[Dict[str, np.ndarray]] = None
+    ) -> Tuple[TransformerMixin, np.ndarray, Dict[str, np.ndarray]]:
+        '''Fit `transformer` to `X` and transform `X` and `others`, or load them if cached.
+
+        Parameters
+        ----------
+        transformer : TransformerMixin
+            Unfitted transformer.
+        key : str
+            See `key`.
+        X, y : np.ndarray
+            Data to be fitted.
+        others : Dict[str, np.ndarray], optional
+            Data to be transformed by fitted transformer, e.g. {'valid': X_valid, 'test': X_test}.
+
+        Returns
+        -------
+        (transformer, Xt, others_t) : Tuple[TransformerMixin, np.ndarray, Dict[str, np.ndarray]]
+            Fitted transformer, transformed `X` and transformed `others`.
+            Arrays loaded from cache are memory-mapped read-only.
+        '''
+        others = {} if others is None else others
+        entry_dir = os.path.join(self.cache_dir, key)
+        filepaths = {
+            name: os.path.join(entry_dir, f'{name}.npy') for name in [FIT_OUTPUT_NAME, *others]}
+        if os.path.isfile(os.path.join(entry_dir, TRANSFORMER_FILENAME)) \
+                and os.path.isfile(filepaths[FIT_OUTPUT_NAME]):
+            with open(os.path.join(entry_dir, TRANSFORMER_FILENAME), 'rb') as f:
+                fitted = pickle.load(f)
+            # Entry written with other `others` gets outputs of the cached transformer added
+            missing = {
+                name: np.asarray(fitted.transform(X_)) for name, X_ in others.items()
+                if not os.path.isfile(filepaths[name])}
+            self._add_outputs(entry_dir, missing)
+            outputs = {name: np.load(p, mmap_mode='r') for name, p in filepaths.items()}
+            return fitted, outputs.pop(FIT_OUTPUT_NAME), outputs
+        fitted = transformer
+        outputs = {FIT_OUTPUT_NAME: np.asarray(fitted.fit_transform(X, y))}
+        outputs.update({name: np.asarray(fitted.transform(X_)) for name, X_ in others.items()})
+        self._write(entry_dir, fitted, outputs)
+        return fitted, outputs.pop(FIT_OUTPUT_NAME), outputs
+
+    def _write(
+            self,
+            entry_dir: str,
+            fitted: TransformerMixin,
+            outputs: Dict[str, np.ndarray]) -> None:
+        # Written into temporary directory and renamed, so that concurrent writers do not break it.
+        # Existing entry is kept, so that readers of it never see it removed.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        for name, array in outputs.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+        with open(os.path.join(tmp_dir, TRANSFORMER_FILENAME), 'wb') as f:
+            pickle.dump(fitted, f, protocol=-1)
+        try:
+            if os.path.exists(entry_dir):
+                raise FileExistsError(entry_dir)
+            # Fails if another process has renamed its non-empty directory in the meantime
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _add_outputs(self, entry_dir: str, outputs: Dict[str, np.ndarray]) -> None:
+        # Each file is written under temporary name and renamed, so that readers never see it partly
+        for name, array in outputs.items():
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.npy.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(entry_dir, f'{name}.npy'))
+
+
+def array_fingerprint(*arrays: np.ndarray) -> str:
+    '''sha1 of shapes, dtypes and values of `arrays`.'''
+    sha1 = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        sha1.update(f'{a.shape}{a.dtype}'.encode())
+        sha1.update(a.view(np.uint8).reshape(-1) if a.dtype != object else str(a.tolist()).encode())
+    return sha1.hexdigest()
+
+
+def _describe(value) -> str:
+    if isinstance(value, BaseEstimator):
+        params = value.get_params(deep=False)
+        return f'{type(value).__module__}.{type(value).__name__}(' \
+            + ', '.join(f'{k}={_describe(v)}' for k, v in sorted(params.items())) + ')'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(_describe(v) for v in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{k!r}: {_describe(v)}' for k, v in sorted(value.items())) + '}'
+    return repr(value)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import random
 from typing import Tuple
@@ -5,27 +6,79 @@ from typing import Tuple
 import numpy as np
 import pandas as pd
 
+NOT_ASSIGNED = -1  # Row in no validation fold
+
 
 class DataFrame(object):
     __SOURCE_DF_COLUMN = '__SOURCE__'
 
     @classmethod
     def merge(cls, df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
+        """Stack 2 dataframes (e.g. training/test set) to transform them at once.
+
+        Neither of `df1` nor `df2` is modified. Source of each row (1 or 2) is recorded in
+        a categorical column, and columns/dtypes of each dataframe in `attrs`, so that
+        `purge` restores them.
+        """
         assert(cls.__SOURCE_DF_COLUMN not in df1.columns.tolist())
         assert(cls.__SOURCE_DF_COLUMN not in df2.columns.tolist())
-        df1['cls.__SOURCE_DF_COLUMN'] = 1
-        df2['cls.__SOURCE_DF_COLUMN'] = 2
-        return pd.concat([df1, df2], axis=0)
+        merged = pd.concat([df1, df2], axis=0)
+        merged[cls.__SOURCE_DF_COLUMN] = pd.Categorical.from_codes(
+            np.repeat([0, 1], [df1.shape[0], df2.shape[0]]), categories=[1, 2])
+        merged.attrs[cls.__SOURCE_DF_COLUMN] = {
+            'merged': merged.dtypes.to_dict(),
+            1: df1.dtypes.to_dict(),
+            2: df2.dtypes.to_dict(),
+        }
+        return merged
 
-    def purge(cls, merged_df: pd.DataFrame) -> pd.DataFrame:
+    @classmethod
+    def purge(cls, merged_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Split output of `merge` into 2 dataframes.
+
+        Columns which only the other dataframe had are dropped, and dtypes changed only by
+        stacking (e.g. int to float because of missing column) are restored.
+        Columns added after `merge` are kept in both.
+        """
         assert(cls.__SOURCE_DF_COLUMN in merged_df.columns.tolist())
-        return (
-            merged_df.query(f'{cls.__SOURCE_DF_COLUMN} == 1'),
-            merged_df.query(f'{cls.__SOURCE_DF_COLUMN} == 2'),
-        )
+        source = merged_df[cls.__SOURCE_DF_COLUMN].values
+        dtypes = merged_df.attrs.get(cls.__SOURCE_DF_COLUMN)
+        out = []
+        for i in (1, 2):
+            df = merged_df[source == i].drop(columns=cls.__SOURCE_DF_COLUMN)
+            if dtypes is not None:
+                df = df.drop(columns=[c for c in dtypes['merged']
+                                      if c not in dtypes[i] and c in df.columns])
+                restored = {c: dtype for c, dtype in dtypes[i].items()
+                            if c in df.columns and df[c].dtype == dtypes['merged'][c] != dtype
+                            and df[c].notnull().all()}
+                df = df.astype(restored)
+            out.append(df)
+        return tuple(out)
 
 
 def seed_everything(seed):
     random.seed(seed)
     os.environ["PYTHONHASHSEED"] = str(seed)
     np.random.seed(seed)
+
+
+def dataset_fingerprint(*columns: pd.Series) -> str:
+    """sha1 of values of `columns`, e.g. `(train.id, train.batterID, train.y)`."""
+    sha1 = hashlib.sha1()
+    for c in columns:
+        sha1.update(pd.util.hash_pandas_object(pd.Series(c), index=False).values.tobytes())
+    return sha1.hexdigest()
+
+
+def fold_keys(row_folds: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Dense fold number of each row for counting kernels, 0 for `NOT_ASSIGNED`, 1... for folds.
+
+    Returns
+    -------
+    (keys, num_keys) : Tuple[np.ndarray, int]
+        Keys of rows, and number of keys including 0 even if no row is `NOT_ASSIGNED`.
+    """
+    folds, keys = np.unique(np.asarray(row_folds, dtype=np.int64), return_inverse=True)
+    has_not_assigned = folds.size > 0 and folds[0] == NOT_ASSIGNED
+    return keys + int(not has_not_assigned), folds.size + int(not has_not_assigned)